@@ -6,7 +6,10 @@ from sqlalchemy import pool
 
 from alembic import context
 
+from app.models.collection import Collection
+from app.models.project import Project
 from app.models.prompt import Prompt
+from app.models.content_blob import ContentBlob
 from app.models.version import Version
 from app.models.tag import Tag
 
@@ -19,7 +22,7 @@ config = context.config
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
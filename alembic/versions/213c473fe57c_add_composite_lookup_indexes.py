@@ -0,0 +1,46 @@
+"""add composite lookup indexes
+
+Revision ID: 213c473fe57c
+Revises: 9a9bcd4f1739
+Create Date: 2026-10-17 09:31:05.552917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '213c473fe57c'
+down_revision: Union[str, None] = '9a9bcd4f1739'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Indexes may already exist where Base.metadata.create_all built the tables
+    op.create_index('ix_prompts_project_id_slug', 'prompts', ['project_id', 'slug'], if_not_exists=True)
+    op.create_index('ix_versions_prompt_id_version_number', 'versions', ['prompt_id', 'version_number'], if_not_exists=True)
+    op.create_index('ix_tags_version_id_name', 'tags', ['version_id', 'name'], if_not_exists=True)
+    op.create_index('ix_collections_project_id_slug', 'collections', ['project_id', 'slug'], if_not_exists=True)
+
+    if sa.inspect(op.get_bind()).get_pk_constraint('collection_prompt').get('constrained_columns'):
+        return
+
+    # The association table never had a key; drop orphaned and duplicate rows before adding one
+    op.execute("DELETE FROM collection_prompt WHERE collection_id IS NULL OR prompt_id IS NULL")
+    op.execute(
+        "DELETE FROM collection_prompt a USING collection_prompt b "
+        "WHERE a.ctid < b.ctid AND a.collection_id = b.collection_id AND a.prompt_id = b.prompt_id"
+    )
+    op.create_primary_key('collection_prompt_pkey', 'collection_prompt', ['collection_id', 'prompt_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('collection_prompt_pkey', 'collection_prompt', type_='primary')
+    op.alter_column('collection_prompt', 'collection_id', nullable=True)
+    op.alter_column('collection_prompt', 'prompt_id', nullable=True)
+    op.drop_index('ix_collections_project_id_slug', table_name='collections')
+    op.drop_index('ix_tags_version_id_name', table_name='tags')
+    op.drop_index('ix_versions_prompt_id_version_number', table_name='versions')
+    op.drop_index('ix_prompts_project_id_slug', table_name='prompts')
@@ -0,0 +1,55 @@
+"""unique version numbers
+
+Revision ID: 5f0c3e9d2a41
+Revises: ac9218eac6c1
+Create Date: 2026-10-17 22:51:07.412930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0c3e9d2a41'
+down_revision: Union[str, None] = 'ac9218eac6c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Concurrent saves could give two versions of a prompt the same number. The first of each
+    # keeps it; the others are renumbered after the prompt's newest version, in creation order.
+    op.execute("""
+        WITH duplicates AS (
+            SELECT id, prompt_id, version_number, created_at,
+                   row_number() OVER (PARTITION BY prompt_id, version_number ORDER BY created_at, id) AS copy
+            FROM versions
+        ),
+        renumbered AS (
+            SELECT d.id,
+                   (SELECT max(version_number) FROM versions v WHERE v.prompt_id = d.prompt_id)
+                   + row_number() OVER (PARTITION BY d.prompt_id ORDER BY d.version_number, d.created_at, d.id)
+                   AS version_number
+            FROM duplicates d
+            WHERE d.copy > 1
+        )
+        UPDATE versions SET version_number = renumbered.version_number
+        FROM renumbered WHERE versions.id = renumbered.id
+    """)
+    # Each prompt keeps one 'latest' tag, on its newest version
+    op.execute("""
+        DELETE FROM tags t USING versions v
+        WHERE t.version_id = v.id AND t.name = 'latest'
+          AND EXISTS (
+            SELECT 1 FROM tags t2 JOIN versions v2 ON v2.id = t2.version_id
+            WHERE t2.name = 'latest' AND v2.prompt_id = v.prompt_id
+              AND (v2.version_number, t2.id) > (v.version_number, t.id)
+          )
+    """)
+    op.drop_index('ix_versions_prompt_id_version_number', table_name='versions')
+    op.create_index('ix_versions_prompt_id_version_number', 'versions', ['prompt_id', 'version_number'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_versions_prompt_id_version_number', table_name='versions')
+    op.create_index('ix_versions_prompt_id_version_number', 'versions', ['prompt_id', 'version_number'])
@@ -0,0 +1,29 @@
+"""add keyset pagination indexes
+
+Revision ID: 74db9b81dacd
+Revises: 213c473fe57c
+Create Date: 2026-10-17 14:12:40.318206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '74db9b81dacd'
+down_revision: Union[str, None] = '213c473fe57c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # List endpoints page in (created_at, id) order, scoped to a project where there is one
+    op.create_index('ix_prompts_project_id_created_at_id', 'prompts', ['project_id', 'created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_collections_project_id_created_at_id', 'collections', ['project_id', 'created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_projects_created_at_id', 'projects', ['created_at', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_projects_created_at_id', table_name='projects')
+    op.drop_index('ix_collections_project_id_created_at_id', table_name='collections')
+    op.drop_index('ix_prompts_project_id_created_at_id', table_name='prompts')
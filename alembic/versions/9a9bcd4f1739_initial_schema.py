@@ -0,0 +1,115 @@
+"""initial schema
+
+Revision ID: 9a9bcd4f1739
+Revises:
+Create Date: 2026-10-17 09:12:40.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9a9bcd4f1739'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created before migrations existed were built by Base.metadata.create_all,
+    # so each table is only created when it is missing.
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('projects'):
+        op.create_table(
+            'projects',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('slug', sa.String(), nullable=True),
+            sa.Column('description', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_projects_id', 'projects', ['id'])
+        op.create_index('ix_projects_name', 'projects', ['name'])
+        op.create_index('ix_projects_slug', 'projects', ['slug'], unique=True)
+
+    if not inspector.has_table('prompts'):
+        op.create_table(
+            'prompts',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('slug', sa.String(), nullable=True),
+            sa.Column('description', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.Column('template_format', sa.Enum('f-string', 'jinja2', name='template_format'), nullable=False),
+            sa.Column('project_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_prompts_id', 'prompts', ['id'])
+        op.create_index('ix_prompts_name', 'prompts', ['name'])
+        op.create_index('ix_prompts_slug', 'prompts', ['slug'])
+
+    if not inspector.has_table('versions'):
+        op.create_table(
+            'versions',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('prompt_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('version_number', sa.Integer(), nullable=True),
+            sa.Column('content', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_versions_id', 'versions', ['id'])
+
+    if not inspector.has_table('tags'):
+        op.create_table(
+            'tags',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('version_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['version_id'], ['versions.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_tags_id', 'tags', ['id'])
+        op.create_index('ix_tags_name', 'tags', ['name'])
+
+    if not inspector.has_table('collections'):
+        op.create_table(
+            'collections',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('name', sa.String(), nullable=True),
+            sa.Column('slug', sa.String(), nullable=True),
+            sa.Column('description', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.Column('project_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_collections_id', 'collections', ['id'])
+        op.create_index('ix_collections_name', 'collections', ['name'])
+        op.create_index('ix_collections_slug', 'collections', ['slug'], unique=True)
+
+    if not inspector.has_table('collection_prompt'):
+        op.create_table(
+            'collection_prompt',
+            sa.Column('collection_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('prompt_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['collection_id'], ['collections.id']),
+            sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id']),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('collection_prompt')
+    op.drop_table('collections')
+    op.drop_table('tags')
+    op.drop_table('versions')
+    op.drop_table('prompts')
+    op.drop_table('projects')
+    sa.Enum(name='template_format').drop(op.get_bind(), checkfirst=True)
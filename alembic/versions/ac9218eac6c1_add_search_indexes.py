@@ -0,0 +1,56 @@
+"""add search indexes
+
+Revision ID: ac9218eac6c1
+Revises: b368c61f85dd
+Create Date: 2026-10-17 16:21:48.774310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'ac9218eac6c1'
+down_revision: Union[str, None] = 'b368c61f85dd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated columns keep the vectors current on every insert and update, like a trigger would
+    op.execute("""
+        ALTER TABLE prompts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', replace(coalesce(slug, ''), '-', ' ')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.execute("""
+        ALTER TABLE content_blobs ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+    """)
+    op.create_index('ix_prompts_search_vector', 'prompts', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_content_blobs_search_vector', 'content_blobs', ['search_vector'], postgresql_using='gin')
+
+    # Fuzzy name and slug matching needs pg_trgm. Servers without it (or without the privilege to
+    # install it) fall back to plain substring matching, see app/services/search.py.
+    op.execute("""
+        DO $$ BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN feature_not_supported OR insufficient_privilege THEN
+            RAISE NOTICE 'pg_trgm unavailable, skipping trigram indexes';
+        END $$
+    """)
+    if op.get_bind().execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar():
+        op.execute("CREATE INDEX ix_prompts_name_trgm ON prompts USING gin (name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_prompts_slug_trgm ON prompts USING gin (slug gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_prompts_slug_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_prompts_name_trgm")
+    op.drop_index('ix_content_blobs_search_vector', table_name='content_blobs')
+    op.drop_index('ix_prompts_search_vector', table_name='prompts')
+    op.drop_column('content_blobs', 'search_vector')
+    op.drop_column('prompts', 'search_vector')
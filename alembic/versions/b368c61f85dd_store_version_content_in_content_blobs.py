@@ -0,0 +1,60 @@
+"""store version content in content blobs
+
+Revision ID: b368c61f85dd
+Revises: 74db9b81dacd
+Create Date: 2026-10-17 15:03:27.906114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b368c61f85dd'
+down_revision: Union[str, None] = '74db9b81dacd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'content_blobs',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('content', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    # Compress prompt-sized text too, not just rows over the default ~2kB TOAST threshold,
+    # and prefer lz4 where the server was built with it
+    op.execute("ALTER TABLE content_blobs SET (toast_tuple_target = 256)")
+    op.execute("""
+        DO $$ BEGIN
+            ALTER TABLE content_blobs ALTER COLUMN content SET COMPRESSION lz4;
+        EXCEPTION WHEN feature_not_supported THEN NULL;
+        END $$
+    """)
+
+    op.execute("""
+        INSERT INTO content_blobs (hash, content, size)
+        SELECT DISTINCT encode(sha256(convert_to(content, 'UTF8')), 'hex'), content, octet_length(content)
+        FROM versions WHERE content IS NOT NULL
+    """)
+    op.add_column('versions', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.execute("""
+        UPDATE versions SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+        WHERE content IS NOT NULL
+    """)
+    op.create_foreign_key('versions_content_hash_fkey', 'versions', 'content_blobs', ['content_hash'], ['hash'])
+    op.create_index('ix_versions_content_hash', 'versions', ['content_hash'])
+    op.drop_column('versions', 'content')
+
+
+def downgrade() -> None:
+    op.add_column('versions', sa.Column('content', sa.String(), nullable=True))
+    op.execute("UPDATE versions v SET content = b.content FROM content_blobs b WHERE b.hash = v.content_hash")
+    op.drop_index('ix_versions_content_hash', table_name='versions')
+    op.drop_constraint('versions_content_hash_fkey', 'versions', type_='foreignkey')
+    op.drop_column('versions', 'content_hash')
+    op.drop_table('content_blobs')
@@ -1,23 +1,30 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.database import get_db
-from app.models.collection import Collection
+from app.api.dependencies import CollectionPath, resolve_collection, resolve_project, tag_filter
+from app.api.pagination import PageParams, finish_page, page_params, paginate
+from app.cache.resolution_cache import invalidate_prompt
+from app.db.database import get_async_db
+from app.models.collection import Collection, collection_prompt
+from app.models.content_blob import ContentBlob
 from app.models.prompt import Prompt
 from app.models.project import Project
+from app.models.version import Version
 from app.schemas.collection import CollectionCreate, CollectionUpdate, CollectionInDB, CollectionList, CollectionWithPrompts
+from app.services.change_feed import publish_change
 from uuid import UUID
 from datetime import datetime
 
 router = APIRouter(prefix="/v1/collections", tags=["collections"])
 
 @router.post("/", response_model=CollectionInDB)
-def create_collection(collection: CollectionCreate, db: Session = Depends(get_db)):
+async def create_collection(collection: CollectionCreate, db: AsyncSession = Depends(get_async_db)):
     # Try finding project by ID first, then by slug if ID is not provided
     if collection.project_id:
-        project = db.query(Project).filter(Project.id == collection.project_id).first()
+        project = await db.scalar(select(Project).where(Project.id == collection.project_id))
     elif collection.project_slug:
-        project = db.query(Project).filter(Project.slug == collection.project_slug).first()
+        project = await db.scalar(select(Project).where(Project.slug == collection.project_slug))
         if project:
             collection.project_id = UUID(str(project.id))
     else:
@@ -28,95 +35,42 @@ def create_collection(collection: CollectionCreate, db: Session = Depends(get_db
 
     db_collection = Collection(**collection.dict(exclude={'project_slug'}))
     db.add(db_collection)
-    db.commit()
-    db.refresh(db_collection)
+    await db.commit()
+    await db.refresh(db_collection)
     return db_collection
 
 @router.put("/{collection_id_or_slug}", response_model=CollectionInDB)
-def update_collection(
-    collection_id_or_slug: str,
+async def update_collection(
     collection: CollectionUpdate,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: CollectionPath = Depends(resolve_collection),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Try to find collection by ID first, then by slug
-    try:
-        collection_id = UUID(collection_id_or_slug)
-        db_collection = db.query(Collection).filter(
-            Collection.id == collection_id,
-            Collection.project_id == project.id
-        ).first()
-    except ValueError:
-        db_collection = db.query(Collection).filter(
-            Collection.slug == collection_id_or_slug,
-            Collection.project_id == project.id
-        ).first()
-
-    if not db_collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    db_collection = resolved.collection
 
     for key, value in collection.dict(exclude_unset=True).items():
         setattr(db_collection, key, value)
 
-    db.commit()
-    db.refresh(db_collection)
+    await db.commit()
+    await db.refresh(db_collection)
     return db_collection
 
 @router.post("/{collection_id_or_slug}/prompts", response_model=dict)
-def add_prompts_to_collection(
-    collection_id_or_slug: str,
+async def add_prompts_to_collection(
     prompt_ids: List[UUID] = Body(..., embed=True),
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: CollectionPath = Depends(resolve_collection),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find collection
-    try:
-        collection_id = UUID(collection_id_or_slug)
-        db_collection = db.query(Collection).filter(
-            Collection.id == collection_id,
-            Collection.project_id == project.id
-        ).first()
-    except ValueError:
-        db_collection = db.query(Collection).filter(
-            Collection.slug == collection_id_or_slug,
-            Collection.project_id == project.id
-        ).first()
+    project, db_collection = resolved.project, resolved.collection
+    await db.refresh(db_collection, ["prompts"])
 
-    if not db_collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    project_prompts = {prompt.id: prompt for prompt in (await db.scalars(select(Prompt).where(
+        Prompt.id.in_(prompt_ids),
+        Prompt.project_id == project.id
+    ))).all()}
 
     added_prompts = []
     for prompt_id in prompt_ids:
-        db_prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
+        db_prompt = project_prompts.get(prompt_id)
 
         if db_prompt and db_prompt not in db_collection.prompts:
             db_collection.prompts.append(db_prompt)
@@ -126,51 +80,30 @@ def add_prompts_to_collection(
         else:
             raise HTTPException(status_code=404, detail="Prompt not found in the same project")
 
-    db.commit()
+    await db.commit()
+    await publish_change(
+        project.id, "collection.prompts_added", collection_id=db_collection.id, collection=db_collection.slug,
+        prompt_ids=added_prompts
+    )
     return {"status": "successfully added prompts to the collection"}
 
 @router.delete("/{collection_id_or_slug}/prompts", response_model=dict)
-def remove_prompts_from_collection(
-    collection_id_or_slug: str,
+async def remove_prompts_from_collection(
     prompt_ids: List[UUID] = Body(..., embed=True),
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: CollectionPath = Depends(resolve_collection),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find collection
-    try:
-        collection_id = UUID(collection_id_or_slug)
-        db_collection = db.query(Collection).filter(
-            Collection.id == collection_id,
-            Collection.project_id == project.id
-        ).first()
-    except ValueError:
-        db_collection = db.query(Collection).filter(
-            Collection.slug == collection_id_or_slug,
-            Collection.project_id == project.id
-        ).first()
+    project, db_collection = resolved.project, resolved.collection
+    await db.refresh(db_collection, ["prompts"])
 
-    if not db_collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    project_prompts = {prompt.id: prompt for prompt in (await db.scalars(select(Prompt).where(
+        Prompt.id.in_(prompt_ids),
+        Prompt.project_id == project.id
+    ))).all()}
 
     removed_prompts = []
     for prompt_id in prompt_ids:
-        db_prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
+        db_prompt = project_prompts.get(prompt_id)
 
         if db_prompt and db_prompt in db_collection.prompts:
             db_collection.prompts.remove(db_prompt)
@@ -178,71 +111,46 @@ def remove_prompts_from_collection(
         else:
             raise HTTPException(status_code=404, detail="Prompt not found in collection")
 
-    db.commit()
+    await db.commit()
+    await publish_change(
+        project.id, "collection.prompts_removed", collection_id=db_collection.id, collection=db_collection.slug,
+        prompt_ids=removed_prompts
+    )
     return {"status": "successfully removed prompts from the collection"}
 
 @router.delete("/{collection_id_or_slug}", response_model=dict)
-def delete_collection(
-    collection_id_or_slug: str,
+async def delete_collection(
     recursive: bool = False,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: CollectionPath = Depends(resolve_collection),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find collection
-    try:
-        collection_id = UUID(collection_id_or_slug)
-        db_collection = db.query(Collection).filter(
-            Collection.id == collection_id,
-            Collection.project_id == project.id
-        ).first()
-    except ValueError:
-        db_collection = db.query(Collection).filter(
-            Collection.slug == collection_id_or_slug,
-            Collection.project_id == project.id
-        ).first()
-
-    if not db_collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    project, db_collection = resolved.project, resolved.collection
+    await db.refresh(db_collection, ["prompts"])
 
+    deleted_prompts = []
     if recursive:
         for prompt in db_collection.prompts:
-            db.delete(prompt)
-
-    db.delete(db_collection)
-    db.commit()
+            deleted_prompts.append((prompt.id, prompt.slug))
+            await db.delete(prompt)
+
+    collection_id, collection_slug = db_collection.id, db_collection.slug
+    await db.delete(db_collection)
+    await db.commit()
+    for prompt_id, slug in deleted_prompts:
+        await invalidate_prompt(prompt_id)
+        await publish_change(project.id, "prompt.deleted", prompt_id=prompt_id, prompt=slug)
+    await publish_change(project.id, "collection.deleted", collection_id=collection_id, collection=collection_slug)
     return {"status": "deleted"}
 
 @router.get("/", response_model=List[CollectionList])
-def get_collections(
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+async def get_collections(
+    response: Response,
+    project: Project = Depends(resolve_project),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    collections = db.query(Collection).filter(Collection.project_id == project.id).all()
+    stmt = paginate(select(Collection).where(Collection.project_id == project.id), Collection, page)
+    collections = finish_page((await db.scalars(stmt)).all(), page, response)
     return [CollectionList(
         id=UUID(str(collection.id)),
         slug=str(collection.slug),
@@ -252,48 +160,34 @@ def get_collections(
     ) for collection in collections]
 
 @router.get("/{collection_id_or_slug}", response_model=CollectionWithPrompts)
-def get_collection(
-    collection_id_or_slug: str,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+async def get_collection(
+    tag: Optional[str] = Query(None),
+    resolved: CollectionPath = Depends(resolve_collection),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    try:
-        collection_id = UUID(collection_id_or_slug)
-        db_collection = db.query(Collection).filter(
-            Collection.id == collection_id,
-            Collection.project_id == project.id
-        ).first()
-    except ValueError:
-        db_collection = db.query(Collection).filter(
-            Collection.slug == collection_id_or_slug,
-            Collection.project_id == project.id
-        ).first()
-
-    if not db_collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    db_collection = resolved.collection
+
+    # The lateral subquery walks the (prompt_id, version_number) index and stops at the first
+    # match: each prompt's newest version, or its newest version carrying `tag`.
+    # Prompts with no such version are left out.
+    latest = select(Version.version_number, Version.content_hash).where(Version.prompt_id == Prompt.id)
+    if tag is not None:
+        latest = latest.where(Version.tags.any(tag_filter(tag)))
+    latest = latest.order_by(Version.version_number.desc()).limit(1).lateral()
+
+    stmt = select(Prompt.id, Prompt.slug, latest.c.version_number, ContentBlob.content).join(
+        collection_prompt, collection_prompt.c.prompt_id == Prompt.id
+    ).join(latest, true()).outerjoin(
+        ContentBlob, ContentBlob.hash == latest.c.content_hash
+    ).where(collection_prompt.c.collection_id == db_collection.id)
 
     prompts_dict = {}
-    for prompt in db_collection.prompts:
-        sorted_versions = sorted(prompt.versions, key=lambda v: v.created_at, reverse=True)
-        if sorted_versions:
-            latest_version = sorted_versions[0]
-            prompts_dict[str(prompt.slug)] = {
-                "id": str(prompt.id),
-                "version": int(str(latest_version.version_number)),
-                "content": str(latest_version.content)
-            }
+    for row in (await db.execute(stmt)).all():
+        prompts_dict[str(row.slug)] = {
+            "id": str(row.id),
+            "version": int(row.version_number),
+            "content": str(row.content)
+        }
 
     return CollectionWithPrompts(
         id=UUID(str(db_collection.id)),
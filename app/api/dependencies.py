@@ -0,0 +1,150 @@
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.db.database import get_async_db
+from app.models.collection import Collection
+from app.models.project import Project
+from app.models.prompt import Prompt
+from app.models.tag import Tag
+from app.models.version import Version
+
+
+class PromptPath(NamedTuple):
+    project: Project
+    prompt: Prompt
+    version: Optional[Version] = None
+
+
+class CollectionPath(NamedTuple):
+    project: Project
+    collection: Collection
+
+
+def project_filter(project_id: Optional[UUID], project_slug: Optional[str]):
+    if not project_id and not project_slug:
+        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
+    return Project.id == project_id if project_id else Project.slug == project_slug
+
+
+def id_or_slug_filter(model, id_or_slug: str):
+    try:
+        return model.id == UUID(id_or_slug)
+    except ValueError:
+        return model.slug == id_or_slug
+
+
+def tag_filter(tag_id_or_name: str):
+    try:
+        return Tag.id == UUID(tag_id_or_name)
+    except ValueError:
+        return Tag.name == tag_id_or_name
+
+
+async def fetch_prompt_path(
+    db: AsyncSession,
+    project_id: Optional[UUID],
+    project_slug: Optional[str],
+    prompt_id_or_slug: str,
+    version: Optional[int] = None,
+    tag: Optional[str] = None,
+    with_content: bool = True,
+) -> PromptPath:
+    """
+    Resolve project -> prompt -> (version number | tag) in a single statement.
+
+    Outer joins keep the project row even when the prompt or version is missing,
+    so the caller still gets a precise 404. Callers that don't need the version's
+    content can leave it unloaded with `with_content=False`.
+    """
+    stmt = select(Project, Prompt).where(project_filter(project_id, project_slug)).outerjoin(
+        Prompt, and_(Prompt.project_id == Project.id, id_or_slug_filter(Prompt, prompt_id_or_slug))
+    )
+    if version is not None:
+        stmt = stmt.add_columns(Version).outerjoin(
+            Version, and_(Version.prompt_id == Prompt.id, Version.version_number == version)
+        )
+    elif tag is not None:
+        stmt = stmt.add_columns(Version).outerjoin(
+            Version, and_(Version.prompt_id == Prompt.id, Version.tags.any(tag_filter(tag)))
+        ).order_by(Version.version_number.desc().nulls_last())
+
+    if not with_content and (version is not None or tag is not None):
+        stmt = stmt.options(defer(Version.content, raiseload=True))
+
+    row = (await db.execute(stmt.limit(1))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if row.Prompt is None:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    if version is not None and row.Version is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    if tag is not None and row.Version is None:
+        raise HTTPException(status_code=404, detail=f"Version with tag '{tag}' not found")
+    return PromptPath(row.Project, row.Prompt, row.Version if version is not None or tag is not None else None)
+
+
+async def fetch_collection_path(
+    db: AsyncSession,
+    project_id: Optional[UUID],
+    project_slug: Optional[str],
+    collection_id_or_slug: str,
+) -> CollectionPath:
+    stmt = select(Project, Collection).where(project_filter(project_id, project_slug)).outerjoin(
+        Collection,
+        and_(Collection.project_id == Project.id, id_or_slug_filter(Collection, collection_id_or_slug))
+    )
+    row = (await db.execute(stmt.limit(1))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if row.Collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return CollectionPath(row.Project, row.Collection)
+
+
+async def fetch_project(db: AsyncSession, project_id: Optional[UUID], project_slug: Optional[str]) -> Project:
+    project = await db.scalar(select(Project).where(project_filter(project_id, project_slug)))
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+
+async def resolve_project(
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> Project:
+    return await fetch_project(db, project_id, project_slug)
+
+
+async def resolve_prompt(
+    prompt_id_or_slug: str,
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> PromptPath:
+    return await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug)
+
+
+async def resolve_prompt_version(
+    prompt_id_or_slug: str,
+    version: int,
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> PromptPath:
+    # Tag routes only need the version's id
+    return await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug, version=version, with_content=False)
+
+
+async def resolve_collection(
+    collection_id_or_slug: str,
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> CollectionPath:
+    return await fetch_collection_path(db, project_id, project_slug, collection_id_or_slug)
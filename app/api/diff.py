@@ -0,0 +1,74 @@
+from uuid import UUID
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import fetch_prompt_path
+from app.db.database import get_async_db
+from app.models.content_blob import ContentBlob
+from app.models.version import Version
+from app.schemas.diff import DiffFormat, DiffGranularity, DiffOp, DiffResponse
+from app.services.version_diff import compute_diff, diff_cache
+
+router = APIRouter(prefix="/v1/prompts", tags=["diff"])
+
+async def fetch_version_ref(
+    db: AsyncSession,
+    project_id: Optional[UUID],
+    project_slug: Optional[str],
+    prompt_id_or_slug: str,
+    ref: str,
+) -> Version:
+    # A number selects a version; anything else is a tag name or id
+    version, tag = (int(ref), None) if ref.isascii() and ref.isdigit() else (None, ref)
+    resolved = await fetch_prompt_path(
+        db, project_id, project_slug, prompt_id_or_slug, version=version, tag=tag, with_content=False
+    )
+    return resolved.version
+
+@router.get("/{prompt_id_or_slug}/diff", response_model=DiffResponse, response_model_exclude_none=True)
+async def diff_versions(
+    prompt_id_or_slug: str,
+    from_ref: str = Query(..., alias="from", description="Version number or tag"),
+    to_ref: str = Query("latest", alias="to", description="Version number or tag"),
+    format: DiffFormat = Query(DiffFormat.unified),
+    granularity: DiffGranularity = Query(DiffGranularity.line),
+    context: int = Query(3, ge=0, le=100, description="Unchanged lines around each hunk in unified diffs"),
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    old = await fetch_version_ref(db, project_id, project_slug, prompt_id_or_slug, from_ref)
+    new = await fetch_version_ref(db, project_id, project_slug, prompt_id_or_slug, to_ref)
+
+    diff = diff_cache.get(old.content_hash, new.content_hash, granularity.value, context)
+    if diff is None:
+        # Content is only read when the diff isn't cached
+        blobs = dict((await db.execute(select(ContentBlob.hash, ContentBlob.content).where(
+            ContentBlob.hash.in_({old.content_hash, new.content_hash})
+        ))).all())
+        diff = await run_in_threadpool(
+            compute_diff, blobs.get(old.content_hash, ""), blobs.get(new.content_hash, ""), granularity.value, context
+        )
+        diff_cache.set(old.content_hash, new.content_hash, granularity.value, context, diff)
+
+    response = DiffResponse(
+        id=UUID(str(old.prompt_id)),
+        from_version=int(old.version_number),
+        to_version=int(new.version_number),
+        format=format,
+        granularity=granularity,
+        identical=diff.identical,
+        additions=diff.additions,
+        deletions=diff.deletions,
+    )
+    if format == DiffFormat.unified:
+        header = f"--- v{old.version_number}\n+++ v{new.version_number}\n"
+        response.unified = (header + diff.unified + "\n") if diff.unified else ""
+    elif format == DiffFormat.structured:
+        response.ops = [DiffOp(**op) for op in diff.ops]
+    else:
+        response.ops = [DiffOp(**op) for op in diff.ops if op["op"] != "equal"]
+    return response
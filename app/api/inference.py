@@ -1,36 +1,91 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from app.schemas.inference import InferenceRequest, InferenceResponse, InferenceStreamResponse
-from app.services.llm_registry import call_llm_api, stream_llm_api, llm_registry
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from app.cache.inference_cache import InferenceCacheOptions, inference_cache, inference_cache_key, replay_chunks
+from app.schemas.inference import (
+    BatchInferenceJob, BatchInferenceRequest, InferenceRequest, InferenceResponse, InferenceStreamResponse
+)
+from app.services.batch_inference import INFERENCE_MAX_BATCH_SIZE, get_job, run_batch, start_job
+from app.services.llm_registry import LLM_ERROR_MESSAGE, build_prompt, call_llm_api, stream_llm_api, llm_registry
+from app.services.stream_registry import stream_registry
+from app.services.streaming import sse_stream
 from typing import AsyncGenerator, Dict, Optional
 
 router = APIRouter(prefix="/v1/inference", tags=["inference"])
 
 @router.post("/", response_model=InferenceResponse)
-async def run_inference(request: InferenceRequest):
+async def run_inference(request: InferenceRequest, http_request: Request, response: Response):
     if request.stream:
+        stream_registry.check_accepting()
+    full_prompt = build_prompt(request.prompt_content, request.input)
+    cache_options = InferenceCacheOptions.from_headers(http_request.headers)
+    cache_key = inference_cache_key(full_prompt, request.model, request.provider)
+
+    cached = await inference_cache.get(cache_key) if cache_options.read else None
+    cache_status = "HIT" if cached is not None else "MISS" if cache_options.read else "BYPASS"
+
+    if request.stream:
+        async def store(output: str) -> None:
+            if output:
+                await inference_cache.set(cache_key, output, cache_options.ttl)
+
+        chunks = replay_chunks(cached) if cached is not None else \
+            stream_llm_api(full_prompt, request.model, request.provider)
         return StreamingResponse(
-            stream_inference(request),
-            media_type='text/event-stream'
+            sse_stream(http_request, chunks, on_complete=store if cached is None and cache_options.write else None),
+            media_type='text/event-stream',
+            headers={"X-Cache": cache_status, "Cache-Control": "no-cache"}
         )
 
-    # Combine the prompt content with the user input
-    full_prompt = f"{request.prompt_content}\n\nUser: {request.input}"
-
-    # Call LLM API using the registry
-    output = await call_llm_api(full_prompt, request.model, request.provider)
+    output = cached
+    if output is None:
+        # Call LLM API using the registry
+        output = await call_llm_api(full_prompt, request.model, request.provider)
+        if cache_options.write and output != LLM_ERROR_MESSAGE:
+            await inference_cache.set(cache_key, output, cache_options.ttl)
 
+    response.headers["X-Cache"] = cache_status
     return InferenceResponse(
         output=output,
         model=request.model,
         provider=request.provider
     )
 
-async def stream_inference(request: InferenceRequest) -> AsyncGenerator[str, None]:
-    full_prompt = f"{request.prompt_content}\n\nUser: {request.input}"
+@router.post("/batch")
+async def run_batch_inference(request: BatchInferenceRequest):
+    """
+    Run one prompt against many inputs, bounded by the per provider/model concurrency limit.
+
+    With `stream` (the default) results are streamed as NDJSON in completion order, one
+    `{"index", "output" | "error"}` object per input. Otherwise the batch runs in the
+    background and a job is returned to poll at `GET /v1/inference/batch/{job_id}`.
+    """
+    if len(request.inputs) > INFERENCE_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {INFERENCE_MAX_BATCH_SIZE} inputs are allowed per batch")
+    # Streamed or in the background, a batch outlives the request; a draining worker wouldn't finish it
+    stream_registry.check_accepting()
+    try:
+        llm_registry.get_provider(request.provider)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if not request.stream:
+        job_id = await start_job(request.prompt_content, request.inputs, request.model, request.provider)
+        return BatchInferenceJob(job_id=job_id, status="running", total=len(request.inputs), completed=0)
+
+    async def results() -> AsyncGenerator[str, None]:
+        async for result in run_batch(request.prompt_content, request.inputs, request.model, request.provider):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
-    async for chunk in stream_llm_api(full_prompt, request.model, request.provider):
-        yield f"data: {chunk}\n\n"
+@router.get("/batch/{job_id}", response_model=BatchInferenceJob)
+async def get_batch_inference_job(job_id: str, offset: int = 0):
+    """Poll a batch job; `offset` skips results already fetched."""
+    job = await get_job(job_id, offset)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @router.get("/models")
 async def get_models(provider: Optional[str] = None) -> Dict[str, Dict[str, str]]:
@@ -0,0 +1,79 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Response header carrying the cursor for the following page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(NamedTuple):
+    limit: int
+    after: Optional[Tuple[datetime, UUID]]
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    payload = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(payload)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_offset_cursor(offset: int) -> str:
+    # For ranked results, which have no stable key to seek past
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["offset"]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def page_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description=f"Cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+) -> PageParams:
+    return PageParams(limit, decode_cursor(after) if after else None)
+
+
+def paginate(stmt: Select, model, page: PageParams) -> Select:
+    """
+    Apply keyset pagination in (created_at, id) order.
+
+    Each page seeks past the last row of the previous one, so its cost doesn't grow with depth
+    the way OFFSET does. One extra row is fetched to tell whether another page follows.
+    """
+    key = tuple_(model.created_at, model.id)
+    if page.after is not None:
+        stmt = stmt.where(key > tuple_(*page.after))
+    return stmt.order_by(model.created_at, model.id).limit(page.limit + 1)
+
+
+def finish_page(rows: Sequence, page: PageParams, response: Response, entity=lambda row: row) -> List:
+    """Trim the look-ahead row and, if there was one, set the cursor for the next page."""
+    rows = list(rows)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = entity(rows[-1])
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
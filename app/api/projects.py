@@ -1,20 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from uuid import UUID
 
-from app.db.database import get_db
+from app.api.dependencies import id_or_slug_filter
+from app.api.pagination import PageParams, finish_page, page_params, paginate
+from app.cache.resolution_cache import invalidate_project
+from app.db.database import get_async_db
 from app.models.project import Project
-from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
+from app.schemas.project import ProjectCreate, ProjectImportResponse, ProjectUpdate, ProjectResponse
+from app.services.change_feed import change_events, parse_cursor, publish_change
+from app.services.project_transfer import export_project, import_project, read_records
+from app.services.stream_registry import stream_registry
 
 router = APIRouter(prefix="/v1/projects", tags=["projects"])
 
 @router.post("/", response_model=ProjectResponse)
-def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project: ProjectCreate, db: AsyncSession = Depends(get_async_db)):
     db_project = Project(**project.dict())
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
     return ProjectResponse(
         id=UUID(str(db_project.id)),
         name=str(db_project.name),
@@ -24,8 +32,12 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
     )
 
 @router.get("/", response_model=List[ProjectResponse])
-def list_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    projects = db.query(Project).offset(skip).limit(limit).all()
+async def list_projects(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db)
+):
+    projects = finish_page((await db.scalars(paginate(select(Project), Project, page))).all(), page, response)
     return [ProjectResponse(
         id=UUID(str(project.id)),
         name=str(project.name),
@@ -35,14 +47,14 @@ def list_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
     ) for project in projects]
 
 @router.get("/{project_id_or_slug}", response_model=ProjectResponse)
-def get_project(project_id_or_slug: str, db: Session = Depends(get_db)):
+async def get_project(project_id_or_slug: str, db: AsyncSession = Depends(get_async_db)):
     # Try to parse as UUID first
     try:
         project_id = UUID(project_id_or_slug)
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.scalar(select(Project).where(Project.id == project_id))
     except ValueError:
         # If it's not a valid UUID, treat it as a slug
-        project = db.query(Project).filter(Project.slug == project_id_or_slug).first()
+        project = await db.scalar(select(Project).where(Project.slug == project_id_or_slug))
 
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -56,14 +68,14 @@ def get_project(project_id_or_slug: str, db: Session = Depends(get_db)):
     )
 
 @router.put("/{project_id_or_slug}", response_model=ProjectResponse)
-def update_project(project_id_or_slug: str, project: ProjectUpdate, db: Session = Depends(get_db)):
+async def update_project(project_id_or_slug: str, project: ProjectUpdate, db: AsyncSession = Depends(get_async_db)):
     # Try to parse as UUID first
     try:
         project_id = UUID(project_id_or_slug)
-        db_project = db.query(Project).filter(Project.id == project_id).first()
+        db_project = await db.scalar(select(Project).where(Project.id == project_id))
     except ValueError:
         # If it's not a valid UUID, treat it as a slug
-        db_project = db.query(Project).filter(Project.slug == project_id_or_slug).first()
+        db_project = await db.scalar(select(Project).where(Project.slug == project_id_or_slug))
 
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -71,8 +83,9 @@ def update_project(project_id_or_slug: str, project: ProjectUpdate, db: Session
     for key, value in project.dict(exclude_unset=True).items():
         setattr(db_project, key, value)
 
-    db.commit()
-    db.refresh(db_project)
+    await db.commit()
+    await db.refresh(db_project)
+    await invalidate_project(db_project.id)
 
     return ProjectResponse(
         id=UUID(str(db_project.id)),
@@ -83,18 +96,79 @@ def update_project(project_id_or_slug: str, project: ProjectUpdate, db: Session
     )
 
 @router.delete("/{project_id_or_slug}", response_model=dict)
-def delete_project(project_id_or_slug: str, db: Session = Depends(get_db)):
+async def delete_project(project_id_or_slug: str, db: AsyncSession = Depends(get_async_db)):
     # Try to parse as UUID first
     try:
         project_id = UUID(project_id_or_slug)
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.scalar(select(Project).where(Project.id == project_id))
     except ValueError:
         # If it's not a valid UUID, treat it as a slug
-        project = db.query(Project).filter(Project.slug == project_id_or_slug).first()
+        project = await db.scalar(select(Project).where(Project.slug == project_id_or_slug))
 
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    db.delete(project)
-    db.commit()
+    deleted_project_id = project.id
+    await db.delete(project)
+    await db.commit()
+    await invalidate_project(deleted_project_id)
+    await publish_change(deleted_project_id, "project.deleted")
     return {"status": "deleted"}
+
+@router.get("/{project_id_or_slug}/export")
+async def export_project_ndjson(project_id_or_slug: str, db: AsyncSession = Depends(get_async_db)):
+    stream_registry.check_accepting()
+    project = await db.scalar(select(Project).where(id_or_slug_filter(Project, project_id_or_slug)))
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return StreamingResponse(
+        export_project(project.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{project.slug}.ndjson"'},
+    )
+
+@router.post("/{project_id_or_slug}/import", response_model=ProjectImportResponse)
+async def import_project_ndjson(project_id_or_slug: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # The body is read as it arrives and written in batches, all in one transaction
+    project, stats = await import_project(db, project_id_or_slug, read_records(request.stream()))
+    await invalidate_project(project.id)
+    await publish_change(project.id, "project.imported", **stats)
+
+    return ProjectImportResponse(
+        project=ProjectResponse(
+            id=UUID(str(project.id)),
+            name=str(project.name),
+            slug=str(project.slug),
+            description=str(project.description) if str(project.description) else None,
+            created_at=project.created_at.replace(tzinfo=None)
+        ),
+        **stats
+    )
+
+@router.get("/{project_id_or_slug}/changes")
+async def project_changes(
+    project_id_or_slug: str,
+    request: Request,
+    after: Optional[str] = Query(None, description="Cursor of the last event seen"),
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    stream_registry.check_accepting()
+    project = await db.scalar(select(Project).where(id_or_slug_filter(Project, project_id_or_slug)))
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    # EventSource clients resume with Last-Event-ID on their own; others can pass ?after=
+    cursor = last_event_id or after
+    if cursor is not None:
+        try:
+            parse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return StreamingResponse(
+        change_events(request, project.id, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
@@ -1,54 +1,82 @@
+import uuid
 from uuid import UUID
 from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import PromptPath, fetch_project, fetch_prompt_path, resolve_project, resolve_prompt
+from app.api.pagination import PageParams, finish_page, page_params, paginate
+from app.cache.resolution_cache import (
+    invalidate_prompt, project_ref, resolution_cache, response_generation, tag_key, version_key
+)
+from app.db.database import get_async_db
 from app.models.prompt import Prompt
 from app.models.tag import Tag
 from app.models.version import Version
 from app.models.project import Project
-from app.schemas.prompt import PromptCreate, PromptResponse, PromptUpdate, TemplateFormat
+from app.schemas.prompt import (
+    PromptCreate, PromptResolution, PromptResolveRequest, PromptResponse, PromptUpdate, TemplateFormat
+)
 from app.schemas.version import VersionResponse
+from app.services.change_feed import publish_change
+from app.services.content_store import content_hash, store_content
+from app.services.versioning import add_version, lock_prompt, move_tag
 
 router = APIRouter(prefix="/v1/prompts", tags=["prompts"])
 
-@router.post("/", response_model=PromptResponse)
-def create_prompt(prompt: PromptCreate, project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None), db: Session = Depends(get_db)):
-        if not project_id and not project_slug:
-               raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-        # Find the project
-        if project_id:
-            project = db.query(Project).filter(Project.id == project_id).first()
-        else:
-            project = db.query(Project).filter(Project.slug == project_slug).first()
-
-        if not project:
-            raise HTTPException(status_code=404, detail="Project not found")
+MAX_RESOLVE_ITEMS = 1000
+
+# One row per requested reference, in request order. The lateral join picks the
+# version by number, or the newest version carrying the tag (matched by name or id).
+RESOLVE_QUERY = text("""
+    SELECT r.idx, p.id AS prompt_id, v.version_number, b.content, v.created_at
+    FROM unnest(
+        CAST(:idx AS int[]), CAST(:ref_ids AS uuid[]), CAST(:ref_slugs AS text[]),
+        CAST(:tags AS text[]), CAST(:versions AS int[])
+    ) AS r(idx, ref_id, ref_slug, tag, version_number)
+    LEFT JOIN prompts p
+        ON p.project_id = :project_id AND (p.id = r.ref_id OR p.slug = r.ref_slug)
+    LEFT JOIN LATERAL (
+        SELECT v.version_number, v.content_hash, v.created_at
+        FROM versions v
+        WHERE v.prompt_id = p.id
+          AND (
+            v.version_number = r.version_number
+            OR (r.tag IS NOT NULL AND EXISTS (
+                SELECT 1 FROM tags t
+                WHERE t.version_id = v.id AND (t.name = r.tag OR t.id::text = r.tag)
+            ))
+          )
+        ORDER BY v.version_number DESC
+        LIMIT 1
+    ) v ON true
+    LEFT JOIN content_blobs b ON b.hash = v.content_hash
+    ORDER BY r.idx
+""")
 
+@router.post("/", response_model=PromptResponse)
+async def create_prompt(prompt: PromptCreate, project: Project = Depends(resolve_project),
+    db: AsyncSession = Depends(get_async_db)):
+        # The prompt, its first version and its 'latest' tag are written in one transaction
         db_prompt = Prompt(
+            id=uuid.uuid4(),
             name=prompt.name,
             slug=prompt.slug,
             description=prompt.description,
             template_format=prompt.template_format,
             project_id=project.id
         )
-        db.add(db_prompt)
-        db.commit()
-        db.refresh(db_prompt)
-
-        # Create initial version
-        initial_version = Version(prompt_id=db_prompt.id, version_number=1, content=prompt.content)
-        db.add(initial_version)
-        db.commit()
-
-        # Create 'latest' tag for the initial version
-        latest_tag = Tag(name="latest", version_id=initial_version.id)
-        db.add(latest_tag)
-        db.commit()
+        initial_version = Version(
+            id=uuid.uuid4(), prompt_id=db_prompt.id, version_number=1,
+            content_hash=await store_content(db, prompt.content)
+        )
+        db.add_all([db_prompt, initial_version, Tag(name="latest", version_id=initial_version.id)])
+        await db.commit()
+        await db.refresh(db_prompt)
+        await publish_change(project.id, "prompt.created", prompt_id=db_prompt.id, prompt=db_prompt.slug, version=1)
 
         return PromptResponse(
             id=UUID(str(db_prompt.id)),
@@ -62,104 +90,146 @@ def create_prompt(prompt: PromptCreate, project_id: Optional[UUID] = Query(None)
         )
 
 @router.get("/", response_model=List[PromptResponse])
-def list_prompts(
+async def list_prompts(
+    response: Response,
+    project: Project = Depends(resolve_project),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Version numbers are aggregated per prompt in the database, from the (prompt_id, version_number)
+    # index, rather than loaded as Version rows
+    version_numbers = select(
+        func.array_agg(aggregate_order_by(Version.version_number, Version.version_number))
+    ).where(Version.prompt_id == Prompt.id).scalar_subquery()
+
+    stmt = select(Prompt, version_numbers.label("versions")).where(Prompt.project_id == project.id)
+    stmt = paginate(stmt, Prompt, page)
+    rows = finish_page((await db.execute(stmt)).all(), page, response, entity=lambda row: row.Prompt)
+    return [PromptResponse(
+        id=UUID(str(row.Prompt.id)),
+        name=str(row.Prompt.name),
+        slug=str(row.Prompt.slug),
+        description=str(row.Prompt.description) if str(row.Prompt.description) else None,
+        template_format=TemplateFormat(row.Prompt.template_format),
+        versions=row.versions or [],
+        created_at=row.Prompt.created_at.replace(tzinfo=None),
+        project_id=UUID(str(row.Prompt.project_id))
+    ) for row in rows]
+
+@router.post(":resolve", response_model=List[PromptResolution])
+async def resolve_prompts(
+    request: PromptResolveRequest,
     project_id: Optional[UUID] = Query(None),
     project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Resolve many prompt references in one round trip.
+
+    Each item names a prompt by id or slug and a tag or version number (tag 'latest'
+    when neither is given). Results come back in request order; items that can't be
+    resolved carry an error instead of failing the batch.
+    """
     if not project_id and not project_slug:
         raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
+    if len(request.items) > MAX_RESOLVE_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RESOLVE_ITEMS} items can be resolved per request")
+
+    project = project_ref(project_id, project_slug)
+    results: List[PromptResolution] = []
+    misses = []
+    for item in request.items:
+        resolution = PromptResolution(**item.dict())
+        results.append(resolution)
+        if item.tag is not None and item.version is not None:
+            resolution.error = "Specify either tag or version, not both"
+            continue
+        if item.version is None and item.tag is None:
+            resolution.tag = "latest"
+
+        if resolution.version is not None:
+            cache_key = version_key(project, item.prompt, resolution.version)
+        else:
+            cache_key = tag_key(project, item.prompt, resolution.tag)
+        cached = resolution_cache.get(cache_key)
+        if cached is not None:
+            resolution.result = cached
+        else:
+            misses.append((resolution, cache_key))
+
+    if not misses:
+        return results
+
+    since = resolution_cache.generation()
+    db_project = await fetch_project(db, project_id, project_slug)
+
+    ref_ids, ref_slugs = [], []
+    for resolution, _ in misses:
+        try:
+            ref_ids.append(UUID(resolution.prompt))
+            ref_slugs.append(None)
+        except ValueError:
+            ref_ids.append(None)
+            ref_slugs.append(resolution.prompt)
+
+    rows = (await db.execute(RESOLVE_QUERY, {
+        "idx": list(range(len(misses))),
+        "ref_ids": ref_ids,
+        "ref_slugs": ref_slugs,
+        "tags": [resolution.tag for resolution, _ in misses],
+        "versions": [resolution.version for resolution, _ in misses],
+        "project_id": db_project.id,
+    })).all()
+
+    for row in rows:
+        resolution, cache_key = misses[row.idx]
+        if row.prompt_id is None:
+            resolution.error = "Prompt not found"
+        elif row.version_number is None:
+            resolution.error = "Version not found" if resolution.version is not None \
+                else f"Version with tag '{resolution.tag}' not found"
+        else:
+            resolution.result = VersionResponse(
+                id=UUID(str(row.prompt_id)),
+                version=int(row.version_number),
+                content=str(row.content),
+                created_at=row.created_at.replace(tzinfo=None)
+            )
+            resolution_cache.set(cache_key, resolution.result, db_project.id, row.prompt_id, since)
 
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    prompts = db.query(Prompt).filter(Prompt.project_id == project.id).all()
-    return [PromptResponse(
-        id=UUID(str(prompt.id)),
-        name=str(prompt.name),
-        slug=str(prompt.slug),
-        description=str(prompt.description) if str(prompt.description) else None,
-        template_format=TemplateFormat(prompt.template_format),
-        versions=[int(str(v.version_number)) for v in prompt.versions],
-        created_at=prompt.created_at.replace(tzinfo=None),
-        project_id=UUID(str(prompt.project_id))
-    ) for prompt in prompts]
+    return results
 
 @router.put("/{prompt_id_or_slug}", response_model=PromptResponse)
-def update_prompt(
-    prompt_id_or_slug: str,
+async def update_prompt(
     prompt: PromptUpdate,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: PromptPath = Depends(resolve_prompt),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find the prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        db_prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        db_prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not db_prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    db_prompt = resolved.prompt
 
     for key, value in prompt.dict(exclude_unset=True, exclude={'content'}).items():
         setattr(db_prompt, key, value)
 
+    # Saving unchanged content doesn't create a version. The check and the new version's number
+    # are read under the prompt's row lock, so concurrent saves can't both claim the same number.
+    new_version_number = None
     if prompt.content:
-        latest_version = db.query(Version).filter(
-            Version.prompt_id == db_prompt.id
-        ).order_by(Version.version_number.desc()).first()
-
-        new_version_number = 1 if latest_version is None else latest_version.version_number + 1
-        new_version = Version(
-            prompt_id=db_prompt.id,
-            version_number=new_version_number,
-            content=prompt.content
-        )
-        db.add(new_version)
-        db.commit()
-        db.refresh(new_version)
-
-        # First, delete any existing "latest" tags for this prompt
-        existing_latest_tags = db.query(Tag).join(Version).filter(
-            Tag.name == "latest",
-            Version.prompt_id == db_prompt.id
-        ).all()
-
-        for tag in existing_latest_tags:
-            db.delete(tag)
-
-        # Create new "latest" tag
-        new_latest_tag = Tag(name="latest", version_id=new_version.id)
-        db.add(new_latest_tag)
-        db.commit()
+        latest = await lock_prompt(db, db_prompt.id)
+        digest = content_hash(prompt.content)
+        if latest is None or latest.content_hash != digest:
+            new_version_number = 1 if latest is None else latest.version_number + 1
+            version_id = await add_version(db, db_prompt.id, new_version_number, await store_content(db, prompt.content))
+            await move_tag(db, db_prompt.id, "latest", version_id)
+
+    await db.commit()
+    await invalidate_prompt(db_prompt.id)
+    await publish_change(
+        db_prompt.project_id, "prompt.updated", prompt_id=db_prompt.id, prompt=db_prompt.slug, version=new_version_number
+    )
 
-    db.commit()
-    db.refresh(db_prompt)
+    version_numbers = (await db.scalars(select(Version.version_number).where(
+        Version.prompt_id == db_prompt.id
+    ).order_by(Version.version_number))).all()
 
     return PromptResponse(
         id=UUID(str(db_prompt.id)),
@@ -167,45 +237,21 @@ def update_prompt(
         slug=str(db_prompt.slug),
         description=str(db_prompt.description) if str(db_prompt.description) else None,
         template_format=TemplateFormat(db_prompt.template_format),
-        versions=[int(str(v.version_number)) for v in db_prompt.versions],
+        versions=list(version_numbers),
         created_at=db_prompt.created_at.replace(tzinfo=None),
         project_id=UUID(str(db_prompt.project_id))
     )
 
 @router.get("/{prompt_id_or_slug}", response_model=PromptResponse)
-def get_prompt(
-    prompt_id_or_slug: str,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+async def get_prompt(
+    resolved: PromptPath = Depends(resolve_prompt),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
+    prompt = resolved.prompt
 
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find the prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
+    version_numbers = (await db.scalars(select(Version.version_number).where(
+        Version.prompt_id == prompt.id
+    ).order_by(Version.version_number))).all()
 
     return PromptResponse(
         id=UUID(str(prompt.id)),
@@ -213,149 +259,86 @@ def get_prompt(
         slug=str(prompt.slug),
         description=str(prompt.description) if str(prompt.description) else None,
         template_format=TemplateFormat(prompt.template_format),
-        versions=[int(str(v.version_number)) for v in prompt.versions],
+        versions=list(version_numbers),
         created_at=prompt.created_at.replace(tzinfo=None),
         project_id=UUID(str(prompt.project_id))
     )
 
 @router.delete("/{prompt_id_or_slug}", response_model=dict)
-def delete_prompt(
-    prompt_id_or_slug: str,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+async def delete_prompt(
+    resolved: PromptPath = Depends(resolve_prompt),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
+    prompt = resolved.prompt
 
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find the prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    db.delete(prompt)
-    db.commit()
+    deleted_prompt_id, project_id, slug = prompt.id, prompt.project_id, prompt.slug
+    await db.delete(prompt)
+    await db.commit()
+    await invalidate_prompt(deleted_prompt_id)
+    await publish_change(project_id, "prompt.deleted", prompt_id=deleted_prompt_id, prompt=slug)
     return {"status": "deleted"}
 
 @router.get("/{prompt_id_or_slug}/versions/{version}", response_model=VersionResponse)
-def get_prompt_version(
+async def get_prompt_version(
     prompt_id_or_slug: str,
     version: int,
+    request: Request,
     project_id: Optional[UUID] = Query(None),
     project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not project_id and not project_slug:
         raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
 
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find the prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    version_obj = db.query(Version).filter(
-        Version.prompt_id == prompt.id,
-        Version.version_number == version
-    ).first()
-
-    if not version_obj:
-        raise HTTPException(status_code=404, detail="Version not found")
-
-    return VersionResponse(
+    cache_key = version_key(
+        project_ref(project_id, project_slug), prompt_id_or_slug, version, response_generation(request)
+    )
+    cached = resolution_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    since = resolution_cache.generation()
+    resolved = await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug, version=version)
+    version_obj = resolved.version
+
+    response = VersionResponse(
         id=UUID(str(version_obj.prompt_id)),
         version=int(str(version_obj.version_number)),
         content=str(version_obj.content),
         created_at=version_obj.created_at.replace(tzinfo=None)
     )
+    resolution_cache.set(cache_key, response, resolved.project.id, resolved.prompt.id, since)
+    return response
 
 @router.get("/{prompt_id_or_slug}/tags/{tag_name}", response_model=VersionResponse)
-def get_prompt_by_tag(
+async def get_prompt_by_tag(
     prompt_id_or_slug: str,
     tag_name: str,
+    request: Request,
     project_id: Optional[UUID] = Query(None),
     project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not project_id and not project_slug:
         raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
 
-    # Find the project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find the prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    # Get the version with the specified tag
-    version = db.query(Version).join(Tag).filter(
-        Version.prompt_id == prompt.id,
-        Tag.name == tag_name
-    ).first()
-
-    if not version:
-        raise HTTPException(status_code=404, detail=f"Version with tag '{tag_name}' not found")
-
-    return VersionResponse(
+    cache_key = tag_key(
+        project_ref(project_id, project_slug), prompt_id_or_slug, tag_name, response_generation(request)
+    )
+    cached = resolution_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    since = resolution_cache.generation()
+    # Project, prompt and tagged version come back from one joined query
+    resolved = await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug, tag=tag_name)
+    version = resolved.version
+
+    response = VersionResponse(
         id=UUID(str(version.prompt_id)),
         version=int(str(version.version_number)),
         content=str(version.content),
         created_at=version.created_at.replace(tzinfo=None)
     )
+    resolution_cache.set(cache_key, response, resolved.project.id, resolved.prompt.id, since)
+    return response
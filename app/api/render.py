@@ -0,0 +1,95 @@
+import json
+from uuid import UUID
+from typing import Any, Dict, Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import PromptPath, fetch_prompt_path
+from app.db.database import get_async_db
+from app.schemas.render import BulkRenderRequest, RenderRequest, RenderResponse
+from app.services.template_renderer import TemplateRenderError, template_renderer
+
+router = APIRouter(prefix="/v1/prompts", tags=["render"])
+
+# Rows rendered per chunk written to a bulk response
+RENDER_CHUNK_SIZE = 500
+
+async def fetch_render_target(
+    db: AsyncSession,
+    project_id: Optional[UUID],
+    project_slug: Optional[str],
+    prompt_id_or_slug: str,
+    version: Optional[int],
+    tag: Optional[str],
+) -> PromptPath:
+    if version is not None and tag is not None:
+        raise HTTPException(status_code=400, detail="Specify either tag or version, not both")
+    if version is None and tag is None:
+        tag = "latest"
+    return await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug, version=version, tag=tag)
+
+def compile_version(resolved: PromptPath):
+    try:
+        return template_renderer.compile(str(resolved.version.content), str(resolved.prompt.template_format))
+    except TemplateRenderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def render_rows(template, rows: List[Dict[str, Any]]) -> Iterator[str]:
+    for start in range(0, len(rows), RENDER_CHUNK_SIZE):
+        lines = []
+        for index in range(start, min(start + RENDER_CHUNK_SIZE, len(rows))):
+            try:
+                line = {"index": index, "output": template.render(rows[index])}
+            except TemplateRenderError as e:
+                line = {"index": index, "error": str(e)}
+            lines.append(json.dumps(line) + "\n")
+        yield "".join(lines)
+
+@router.post("/{prompt_id_or_slug}/render", response_model=RenderResponse)
+async def render_prompt(
+    prompt_id_or_slug: str,
+    request: RenderRequest,
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    resolved = await fetch_render_target(db, project_id, project_slug, prompt_id_or_slug, request.version, request.tag)
+    # Compiling and rendering are CPU-bound and bounded only by the renderer's limits, so they run
+    # off the event loop, as the bulk rows do
+    template = await run_in_threadpool(compile_version, resolved)
+
+    try:
+        output = await run_in_threadpool(template.render, request.variables)
+    except TemplateRenderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return RenderResponse(
+        id=UUID(str(resolved.prompt.id)),
+        version=int(str(resolved.version.version_number)),
+        output=output
+    )
+
+@router.post("/{prompt_id_or_slug}/render/bulk")
+async def render_prompt_bulk(
+    prompt_id_or_slug: str,
+    request: BulkRenderRequest,
+    project_id: Optional[UUID] = Query(None),
+    project_slug: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Render one version against many variable rows.
+
+    Streams one JSON object per line, in row order: `{"index", "output"}` on success or
+    `{"index", "error"}` for rows that fail. A template that doesn't compile fails the request.
+    """
+    resolved = await fetch_render_target(db, project_id, project_slug, prompt_id_or_slug, request.version, request.tag)
+    template = await run_in_threadpool(compile_version, resolved)
+
+    return StreamingResponse(
+        render_rows(template, request.rows),
+        media_type="application/x-ndjson",
+        headers={"X-Prompt-Version": str(resolved.version.version_number)}
+    )
@@ -0,0 +1,49 @@
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import resolve_project
+from app.api.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_offset_cursor, encode_offset_cursor
+)
+from app.db.database import get_async_db
+from app.models.project import Project
+from app.schemas.search import SearchContentScope, SearchResult
+from app.services.search import prompt_search
+
+router = APIRouter(prefix="/v1/search", tags=["search"])
+
+@router.get("/", response_model=List[SearchResult])
+async def search_prompts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    content: SearchContentScope = Query(SearchContentScope.none, description="Also search version content"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description=f"Cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+    project: Project = Depends(resolve_project),
+    db: AsyncSession = Depends(get_async_db)
+):
+    offset = decode_offset_cursor(after) if after else 0
+    rows = await prompt_search.search(db, project.id, q, content.value, limit + 1, offset)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_offset_cursor(offset + limit)
+
+    results = []
+    for row in rows:
+        highlights = {
+            field: row[f"{field}_highlight"] for field in ("name", "description", "content")
+            if row[f"{field}_highlight"] and "<mark>" in row[f"{field}_highlight"]
+        }
+        results.append(SearchResult(
+            id=UUID(str(row["prompt_id"])),
+            slug=str(row["slug"]),
+            name=str(row["name"]),
+            description=row["description"],
+            score=round(float(row["score"]), 6),
+            matched=(["prompt"] if row["prompt_matched"] else []) + (["content"] if row["version_number"] else []),
+            version=row["version_number"],
+            highlights=highlights,
+        ))
+    return results
@@ -1,251 +1,111 @@
 from uuid import UUID
 from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_db
+from app.api.dependencies import PromptPath, fetch_prompt_path, resolve_prompt_version, tag_filter
+from app.cache.resolution_cache import invalidate_tag, project_ref, resolution_cache, response_generation, tag_key
+from app.db.database import get_async_db
 from app.models.tag import Tag
-from app.models.version import Version
-from app.models.prompt import Prompt
-from app.models.project import Project
 from app.schemas.tag import TagCreate, TagResponse
 from app.schemas.version import VersionResponse
+from app.services.change_feed import publish_change
+from app.services.versioning import lock_prompt, move_tag
 
 router = APIRouter(prefix="/v1/prompts", tags=["tags"])
 
 @router.get("/{prompt_id_or_slug}/versions/{version}/tags", response_model=List[TagResponse])
-def get_tags(
-    prompt_id_or_slug: str,
-    version: int,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+async def get_tags(
+    resolved: PromptPath = Depends(resolve_prompt_version),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    version_obj = db.query(Version).filter(
-        Version.prompt_id == prompt.id,
-        Version.version_number == version
-    ).first()
-
-    if not version_obj:
-        raise HTTPException(status_code=404, detail="Version not found")
-
+    tags = (await db.scalars(select(Tag).where(Tag.version_id == resolved.version.id))).all()
     return [TagResponse(
         id=UUID(str(tag.id)),
         name=str(tag.name)
-    ) for tag in version_obj.tags]
+    ) for tag in tags]
 
 @router.post("/{prompt_id_or_slug}/versions/{version}/tags", response_model=TagResponse)
-def create_tag(
-    prompt_id_or_slug: str,
-    version: int,
+async def create_tag(
     tag: TagCreate,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: PromptPath = Depends(resolve_prompt_version),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    # Verify version exists
-    version_obj = db.query(Version).filter(
-        Version.prompt_id == prompt.id,
-        Version.version_number == version
-    ).first()
+    prompt, version_obj = resolved.prompt, resolved.version
 
-    if not version_obj:
-        raise HTTPException(status_code=404, detail="Version not found")
+    # A prompt has at most one tag per name; an existing one moves to this version
+    await lock_prompt(db, prompt.id)
+    tag_id = await move_tag(db, prompt.id, tag.name, version_obj.id)
+    await db.commit()
 
-    # Check if tag already exists
-    existing_tag = db.query(Tag).join(Version).filter(
-        Tag.name == tag.name,
-        Version.prompt_id == prompt.id
-    ).first()
-
-    if existing_tag:
-        db.delete(existing_tag)
-        db.commit()
-
-    # Create new tag
-    new_tag = Tag(name=tag.name, version_id=version_obj.id)
-    db.add(new_tag)
-
-    try:
-        db.commit()
-        db.refresh(new_tag)
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail="Failed to create tag")
+    await invalidate_tag(prompt.id, tag.name)
+    await publish_change(
+        prompt.project_id, "tag.set", prompt_id=prompt.id, prompt=prompt.slug, tag=tag.name,
+        version=version_obj.version_number
+    )
 
     return TagResponse(
-        id=UUID(str(new_tag.id)),
-        name=str(new_tag.name)
+        id=UUID(str(tag_id)),
+        name=tag.name
     )
 
 @router.delete("/{prompt_id_or_slug}/versions/{version}/tags/{tag_id_or_name}", response_model=dict)
-def delete_tag(
-    prompt_id_or_slug: str,
-    version: int,
+async def delete_tag(
     tag_id_or_name: str,
-    project_id: Optional[UUID] = Query(None),
-    project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    resolved: PromptPath = Depends(resolve_prompt_version),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not project_id and not project_slug:
-        raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
-
-    # Find project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    prompt, version_obj = resolved.prompt, resolved.version
 
-    # Find prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    # Find tag
-    try:
-        tag_id = UUID(tag_id_or_name)
-        tag_filter = Tag.id == tag_id
-    except ValueError:
-        tag_filter = Tag.name == tag_id_or_name
-
-    tag = db.query(Tag).join(Version).filter(
-        Version.prompt_id == prompt.id,
-        Version.version_number == version,
-        tag_filter
-    ).first()
+    tag = await db.scalar(select(Tag).where(
+        Tag.version_id == version_obj.id,
+        tag_filter(tag_id_or_name)
+    ))
 
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
 
-    db.delete(tag)
-    db.commit()
+    tag_name = str(tag.name)
+    await db.delete(tag)
+    await db.commit()
+    await invalidate_tag(prompt.id, tag_name)
+    await publish_change(
+        prompt.project_id, "tag.deleted", prompt_id=prompt.id, prompt=prompt.slug, tag=tag_name,
+        version=version_obj.version_number
+    )
     return {"status": "deleted"}
 
 @router.get("/{prompt_id_or_slug}/tags/{tag_id_or_name}", response_model=VersionResponse)
-def get_prompt_by_tag(
+async def get_prompt_by_tag(
     prompt_id_or_slug: str,
     tag_id_or_name: str,
+    request: Request,
     project_id: Optional[UUID] = Query(None),
     project_slug: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not project_id and not project_slug:
         raise HTTPException(status_code=400, detail="Either project_id or project_slug must be provided")
 
-    # Find project
-    if project_id:
-        project = db.query(Project).filter(Project.id == project_id).first()
-    else:
-        project = db.query(Project).filter(Project.slug == project_slug).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Find prompt
-    try:
-        prompt_id = UUID(prompt_id_or_slug)
-        prompt = db.query(Prompt).filter(
-            Prompt.id == prompt_id,
-            Prompt.project_id == project.id
-        ).first()
-    except ValueError:
-        prompt = db.query(Prompt).filter(
-            Prompt.slug == prompt_id_or_slug,
-            Prompt.project_id == project.id
-        ).first()
-
-    if not prompt:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    # Find tag and associated version
-    try:
-        tag_id = UUID(tag_id_or_name)
-        tag_filter = Tag.id == tag_id
-    except ValueError:
-        tag_filter = Tag.name == tag_id_or_name
-
-    version = db.query(Version).join(Tag).filter(
-        Version.prompt_id == prompt.id,
-        tag_filter
-    ).order_by(Version.version_number.desc()).first()
+    cache_key = tag_key(
+        project_ref(project_id, project_slug), prompt_id_or_slug, tag_id_or_name, response_generation(request)
+    )
+    cached = resolution_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    if not version:
-        raise HTTPException(status_code=404, detail="Version with tag not found")
+    since = resolution_cache.generation()
+    # Project, prompt and tagged version come back from one joined query
+    resolved = await fetch_prompt_path(db, project_id, project_slug, prompt_id_or_slug, tag=tag_id_or_name)
+    version = resolved.version
 
-    return VersionResponse(
+    response = VersionResponse(
         id=UUID(str(version.prompt_id)),
         version=int(str(version.version_number)),
         content=str(version.content),
         created_at=version.created_at.replace(tzinfo=None)
     )
+    resolution_cache.set(cache_key, response, resolved.project.id, resolved.prompt.id, since)
+    return response
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+from typing import AsyncGenerator, Mapping, NamedTuple, Optional
+
+from redis.exceptions import RedisError
+
+from app.cache.lru import LRUCache
+from app.cache.redis_cache import redis_client
+from app.metrics import CACHE_REQUESTS, observe_cache
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_CACHE_ENABLED = os.getenv("INFERENCE_CACHE_ENABLED", "false").lower() == "true"
+INFERENCE_CACHE_TTL = int(os.getenv("INFERENCE_CACHE_TTL", "86400"))
+INFERENCE_CACHE_SIZE = int(os.getenv("INFERENCE_CACHE_SIZE", "1000"))
+# Characters per event when a cached completion is replayed as a stream
+INFERENCE_CACHE_REPLAY_CHUNK = int(os.getenv("INFERENCE_CACHE_REPLAY_CHUNK", "64"))
+
+
+class InferenceCacheOptions(NamedTuple):
+    read: bool
+    write: bool
+    ttl: int
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str]) -> "InferenceCacheOptions":
+        """
+        Per-request cache control.
+
+        `X-Inference-Cache: on|off` overrides INFERENCE_CACHE_ENABLED. `Cache-Control: no-cache`
+        skips the lookup but stores the fresh result; `no-store` skips both.
+        `X-Inference-Cache-TTL` sets the lifetime of the stored entry in seconds.
+        """
+        switch = headers.get("x-inference-cache", "").lower()
+        enabled = switch == "on" if switch in ("on", "off") else INFERENCE_CACHE_ENABLED
+
+        directives = {d.strip().lower() for d in headers.get("cache-control", "").split(",")}
+        try:
+            ttl = int(headers.get("x-inference-cache-ttl", INFERENCE_CACHE_TTL))
+        except ValueError:
+            ttl = INFERENCE_CACHE_TTL
+        return cls(
+            read=enabled and "no-cache" not in directives and "no-store" not in directives,
+            write=enabled and "no-store" not in directives and ttl > 0,
+            ttl=ttl,
+        )
+
+
+def inference_cache_key(prompt: str, model: str, provider: str) -> str:
+    payload = json.dumps({"prompt": prompt, "model": model, "provider": provider.lower()}, sort_keys=True)
+    return f"pn:infer:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class InferenceCache:
+    """Completed LLM outputs keyed by assembled prompt and model, in a per-worker LRU backed by Redis."""
+
+    def __init__(self, maxsize: int = INFERENCE_CACHE_SIZE, ttl: int = INFERENCE_CACHE_TTL):
+        self._local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.redis_hits = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        output = self._local.get(key)
+        if output is not None:
+            CACHE_REQUESTS.labels("inference", "hit").inc()
+            return output
+        try:
+            async with observe_cache("inference", "get"), redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                cached, ttl = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self.errors += 1
+            CACHE_REQUESTS.labels("inference", "error").inc()
+            logger.warning(f"Inference cache unavailable: {e}")
+            return None
+        if cached is None:
+            CACHE_REQUESTS.labels("inference", "miss").inc()
+            return None
+        self.redis_hits += 1
+        CACHE_REQUESTS.labels("inference", "hit").inc()
+        output = cached.decode()
+        # Keep the local copy no longer than the shared one
+        self._local.set(key, output, ttl=ttl if ttl > 0 else None)
+        return output
+
+    async def set(self, key: str, output: str, ttl: int = INFERENCE_CACHE_TTL) -> None:
+        self._local.set(key, output, ttl=ttl)
+        try:
+            async with observe_cache("inference", "set"):
+                await redis_client.setex(key, ttl, output)
+        except (RedisError, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Failed to store inference result: {e}")
+
+    def stats(self):
+        return {**self._local.stats(), "redis_hits": self.redis_hits, "errors": self.errors}
+
+
+async def replay_chunks(output: str, chunk_size: int = INFERENCE_CACHE_REPLAY_CHUNK) -> AsyncGenerator[str, None]:
+    for start in range(0, len(output), chunk_size):
+        yield output[start:start + chunk_size]
+
+
+inference_cache = InferenceCache()
@@ -6,18 +6,29 @@ import json
 # Get the REDIS_URL from environment variable
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# Callers treat Redis as optional and fall back on errors, so an unreachable server should fail
+# fast instead of holding each request for the OS's TCP timeouts
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+
 # Parse the REDIS_URL
 parsed_url = urlparse(REDIS_URL)
 
-# Create Redis client
-redis_client = aioredis.Redis(
+connection_kwargs = dict(
     host=parsed_url.hostname or 'localhost',
     port=parsed_url.port or 6379,
     db=int(parsed_url.path.lstrip('/') or 0),
     password=parsed_url.password or None,
-    ssl=parsed_url.scheme == 'rediss'
+    ssl=parsed_url.scheme == 'rediss',
+    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
 )
 
+# Create Redis client
+redis_client = aioredis.Redis(**connection_kwargs, socket_timeout=REDIS_SOCKET_TIMEOUT)
+
+# For commands that wait on the server by design (XREAD BLOCK, pub/sub), which a read timeout would cut short
+blocking_redis_client = aioredis.Redis(**connection_kwargs)
+
 async def set_cache(key: str, value: str, expiration: int = 3600):
     await redis_client.setex(key, expiration, value)
 
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from redis.exceptions import RedisError
+
+from app.cache.lru import LRUCache
+from app.cache.redis_cache import blocking_redis_client, redis_client
+from app.schemas.version import VersionResponse
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_CACHE_SIZE = int(os.getenv("RESOLUTION_CACHE_SIZE", "10000"))
+# Backstop only: writes reach every worker's cache through INVALIDATION_CHANNEL
+RESOLUTION_CACHE_TTL = float(os.getenv("RESOLUTION_CACHE_TTL", "300"))
+
+INVALIDATION_CHANNEL = "pn:resolution-invalidations"
+
+# (project ref, prompt ref, kind, selector, response cache generation),
+# e.g. ("slug:default-project", "greeting", "tag", "production", "3.17")
+ResolutionKey = Tuple[str, str, str, str, str]
+
+
+def project_ref(project_id: Optional[UUID], project_slug: Optional[str]) -> str:
+    return f"id:{project_id}" if project_id else f"slug:{project_slug}"
+
+
+def tag_key(project: str, prompt_id_or_slug: str, tag_id_or_name: str, generation: str = "") -> ResolutionKey:
+    try:
+        return (project, prompt_id_or_slug, "tag_id", str(UUID(tag_id_or_name)), generation)
+    except ValueError:
+        return (project, prompt_id_or_slug, "tag", tag_id_or_name, generation)
+
+
+def version_key(project: str, prompt_id_or_slug: str, version: int, generation: str = "") -> ResolutionKey:
+    return (project, prompt_id_or_slug, "version", str(version), generation)
+
+
+def response_generation(request: Request) -> str:
+    """
+    The response cache generation the middleware read for this request, if it will store the response.
+
+    Such a response is kept for every worker under that generation, so it must not come from an entry
+    this worker filled before a write the generation already counts. Keying entries by it means a
+    request only sees entries filled by reads that started after the same writes.
+    """
+    return getattr(request.state, "response_cache_generation", "")
+
+
+class ResolutionCache:
+    """
+    Per-worker cache of resolved prompt versions for the tag and version lookup endpoints.
+
+    Entries are keyed by the identifiers exactly as the client sent them, so a steady
+    stream of lookups never reaches the database. Side indexes from prompt and project
+    ids back to keys let writes drop only the entries they affect.
+
+    Entries are only served while the worker is subscribed to INVALIDATION_CHANNEL, since
+    otherwise it can't hear about writes handled by other workers.
+
+    A read that races a write could put back the entry the write just dropped, so fills
+    carry the `generation()` taken before the database read, and are discarded when the
+    prompt or project has been invalidated since.
+    """
+
+    def __init__(self, maxsize: int = RESOLUTION_CACHE_SIZE, ttl: Optional[float] = RESOLUTION_CACHE_TTL):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl or None)
+        self._cache.on_remove = self._unindex
+        self._lock = threading.Lock()
+        self._owners: Dict[Hashable, Tuple[UUID, UUID]] = {}
+        self._by_prompt: Dict[UUID, Set[ResolutionKey]] = {}
+        self._by_project: Dict[UUID, Set[ResolutionKey]] = {}
+        self.live = False
+        # Generation of the last invalidation of each prompt and project id, newest last. Only the
+        # most recent `maxsize` are kept; a fill older than the last one forgotten is discarded.
+        self._generation = 0
+        self._invalidated: "OrderedDict[UUID, int]" = OrderedDict()
+        self._forgotten = 0
+        self._max_invalidated = maxsize
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: ResolutionKey) -> Optional[VersionResponse]:
+        if not self.live:
+            return None
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: ResolutionKey, value: VersionResponse, project_id: UUID, prompt_id: UUID, since: int) -> None:
+        with self._lock:
+            if not self.live or since < self._forgotten or any(
+                self._invalidated.get(owner_id, 0) > since for owner_id in (project_id, prompt_id)
+            ):
+                return
+            self._cache.set(key, value)
+            self._owners[key] = (project_id, prompt_id)
+            self._by_prompt.setdefault(prompt_id, set()).add(key)
+            self._by_project.setdefault(project_id, set()).add(key)
+
+    def invalidate_tag(self, prompt_id: UUID, tag_name: str) -> None:
+        """Drop lookups of one tag on one prompt; version-number lookups are immutable and survive."""
+        with self._lock:
+            self._mark_invalidated(prompt_id)
+            for key in list(self._by_prompt.get(prompt_id, ())):
+                kind, selector = key[2], key[3]
+                if kind == "tag_id" or (kind == "tag" and selector == tag_name):
+                    self._cache.delete(key)
+
+    def invalidate_prompt(self, prompt_id: UUID) -> None:
+        with self._lock:
+            self._mark_invalidated(prompt_id)
+            for key in list(self._by_prompt.get(prompt_id, ())):
+                self._cache.delete(key)
+
+    def invalidate_project(self, project_id: UUID) -> None:
+        with self._lock:
+            self._mark_invalidated(project_id)
+            for key in list(self._by_project.get(project_id, ())):
+                self._cache.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._forgotten = self._generation
+            self._invalidated.clear()
+            self._cache.clear()
+
+    def apply(self, message: Dict[str, str]) -> None:
+        """Apply an invalidation broadcast by `publish_invalidation`."""
+        owner_id = UUID(message["id"])
+        if message["scope"] == "tag":
+            self.invalidate_tag(owner_id, message["tag"])
+        elif message["scope"] == "prompt":
+            self.invalidate_prompt(owner_id)
+        else:
+            self.invalidate_project(owner_id)
+
+    def _mark_invalidated(self, owner_id: UUID) -> None:
+        self._generation += 1
+        self._invalidated[owner_id] = self._generation
+        self._invalidated.move_to_end(owner_id)
+        if len(self._invalidated) > self._max_invalidated:
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return self._cache.stats()
+
+    def _unindex(self, key: Hashable) -> None:
+        # Runs from inside LRUCache while self._lock is held
+        owner = self._owners.pop(key, None)
+        if owner is None:
+            return
+        project_id, prompt_id = owner
+        for index, owner_id in ((self._by_project, project_id), (self._by_prompt, prompt_id)):
+            keys = index.get(owner_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[owner_id]
+
+
+resolution_cache = ResolutionCache()
+
+
+async def publish_invalidation(scope: str, owner_id: UUID, tag: Optional[str] = None) -> None:
+    """Drop entries for a committed write here, then in every other worker."""
+    message = {"scope": scope, "id": str(owner_id), "tag": tag}
+    resolution_cache.apply(message)
+    try:
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except (RedisError, OSError) as e:
+        # Other workers may be unsubscribed too; if not, their TTL bounds the staleness
+        logger.warning(f"Could not broadcast {scope} invalidation for {owner_id}: {e}")
+
+
+async def invalidate_tag(prompt_id: UUID, tag_name: str) -> None:
+    await publish_invalidation("tag", prompt_id, tag_name)
+
+
+async def invalidate_prompt(prompt_id: UUID) -> None:
+    await publish_invalidation("prompt", prompt_id)
+
+
+async def invalidate_project(project_id: UUID) -> None:
+    await publish_invalidation("project", project_id)
+
+
+class InvalidationListener:
+    """Per-worker subscription that applies other workers' invalidations to `resolution_cache`."""
+
+    def __init__(self, cache: ResolutionCache):
+        self.cache = cache
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with blocking_redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Whatever was published while unsubscribed is lost, so start from empty
+                    self.cache.clear()
+                    self.cache.live = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.cache.apply(json.loads(message["data"]))
+            except (RedisError, OSError) as e:
+                logger.warning(f"Resolution cache invalidations unavailable, bypassing the cache: {e}")
+            finally:
+                self.cache.live = False
+            await asyncio.sleep(1)
+
+    async def aclose(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+invalidation_listener = InvalidationListener(resolution_cache)
@@ -0,0 +1,88 @@
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_WAIT, DB_QUERY_DURATION
+
+
+# Development aids: report each request's SQL in X-Query-* response headers, and warn when one
+# statement repeats often enough to suggest a query per row (N+1) or a request exceeds its budget
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))
+
+
+class QueryStats:
+    """SQL executed on behalf of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements executed at least `threshold` times, most frequent first."""
+        if threshold <= 0:
+            return []
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def over_budget(self) -> bool:
+        return QUERY_BUDGET > 0 and self.count > QUERY_BUDGET
+
+
+# Set by the metrics middleware for the duration of a request. Statements run in child tasks
+# and SQLAlchemy's greenlets see the same object, since both copy the current context.
+request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports its usage and how long each checkout waits for a free connection."""
+
+    def _update_gauges(self) -> None:
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe(elapsed)
+        stats = request_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            # Same SQL with different parameters is the signature of a per-row lazy load
+            stats.statements[statement] += 1
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # Failed statements never reach after_cursor_execute; drop their start time
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
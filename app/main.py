@@ -1,51 +1,111 @@
 import logging
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import collections, prompts, tags, inference, projects
-from app.db.database import engine, Base
-from app.models.prompt import Prompt
-from app.models.version import Version
-from app.models.tag import Tag
-from app.middleware.cache_middleware import cache_middleware
+from app.api import collections, diff, prompts, render, search, tags, inference, projects
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.cache.inference_cache import inference_cache
+from app.cache.resolution_cache import invalidation_listener, resolution_cache
+from app.db.database import async_engine
+from app.metrics import render_metrics
+from app.middleware.cache_middleware import cache_middleware, response_cache_stats
+from app.middleware.metrics_middleware import metrics_middleware
+from app.services.change_feed import change_hub
+from app.services.llm_registry import llm_registry
+from app.services.stream_registry import stream_registry
+from app.services.template_renderer import template_renderer
+from app.services.version_diff import diff_cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-
-# Add CORS middleware first
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Add debug middleware
-@app.middleware("http")
-async def debug_middleware(request: Request, call_next):
-    logger.info(f"Received request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Returning response: Status {response.status_code}")
-    logger.info(f"Response headers: {response.headers}")
-    return response
-
-# Add cache middleware
-# app.middleware("http")(cache_middleware)
-
-# Include routers
-app.include_router(prompts.router)
-app.include_router(tags.router)
-app.include_router(collections.router)
-app.include_router(inference.router)
-app.include_router(projects.router)
-
-# Add a health check endpoint
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider clients hold connection pools for the life of the worker
+    await llm_registry.startup()
+    # Hears other workers' writes, so this worker's resolution cache can be served
+    invalidation_listener.start()
+    # On SIGTERM, wind down streams while the server waits for in-flight requests
+    stream_registry.install()
+    try:
+        yield
+    finally:
+        stream_registry.uninstall()
+        await llm_registry.aclose()
+        await invalidation_listener.aclose()
+        await change_hub.aclose()
+        await async_engine.dispose()
+
+def create_app() -> FastAPI:
+    """
+    Build the API.
+
+    Nothing here touches the network: database pools connect on first use and provider clients
+    start in the lifespan, so importing this module is cheap and safe before a worker forks.
+    The schema is managed by Alembic (`alembic upgrade head`, run by `run_migrations.py`).
+    """
+    app = FastAPI(lifespan=lifespan)
+
+    # Add debug middleware
+    @app.middleware("http")
+    async def debug_middleware(request: Request, call_next):
+        logger.info(f"Received request: {request.method} {request.url}")
+        response = await call_next(request)
+        logger.info(f"Returning response: Status {response.status_code}")
+        logger.info(f"Response headers: {response.headers}")
+        return response
+
+    # Add cache middleware
+    app.middleware("http")(cache_middleware)
+
+    # Its timings include the middleware above
+    app.middleware("http")(metrics_middleware)
+
+    # Added last so it runs outermost: responses the cache middleware answers on its own, hits and
+    # 304s, need CORS headers as much as any other
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # The client is served from another origin and follows list cursors from this header
+        expose_headers=[NEXT_CURSOR_HEADER],
+    )
+
+    # Include routers
+    app.include_router(prompts.router)
+    app.include_router(tags.router)
+    app.include_router(render.router)
+    app.include_router(diff.router)
+    app.include_router(collections.router)
+    app.include_router(search.router)
+    app.include_router(inference.router)
+    app.include_router(projects.router)
+
+    # Add a health check endpoint
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+    # Per-worker counters for the prompt resolution cache, the Redis response cache, compiled templates,
+    # cached inference results and version diffs
+    @app.get("/cache/stats")
+    async def cache_stats():
+        return {
+            "resolution": resolution_cache.stats(),
+            "response": response_cache_stats,
+            "templates": template_renderer.stats(),
+            "inference": inference_cache.stats(),
+            "diffs": diff_cache.stats(),
+        }
+
+    return app
+
+app = create_app()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+# Set when several worker processes serve the app; each writes its samples to this directory
+# and /metrics aggregates them.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, through the last byte of the body",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being served",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+
+# Database
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Connections currently checked out of the pool", multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections", "Connections open beyond the pool size", multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection", buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time to execute one SQL statement", buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed while serving a request",
+    ["route"], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL while serving a request",
+    ["route"], buckets=LATENCY_BUCKETS,
+)
+DB_REPEATED_QUERIES = Counter(
+    "db_repeated_query_requests_total", "Requests that ran one statement often enough to look like N+1",
+    ["route"],
+)
+
+# Redis-backed caches
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups", ["cache", "result"],
+)
+CACHE_OPERATION_DURATION = Histogram(
+    "cache_operation_duration_seconds", "Round trip time of cache operations against Redis",
+    ["cache", "operation"], buckets=LATENCY_BUCKETS,
+)
+
+# Change feed
+CHANGE_FEED_SUBSCRIBERS = Gauge(
+    "change_feed_subscribers", "Clients connected to a project change feed", multiprocess_mode="livesum",
+)
+
+# LLM providers
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "Time for a provider call to complete",
+    ["provider", "model", "mode"], buckets=LLM_BUCKETS,
+)
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "Provider calls by outcome", ["provider", "model", "mode", "status"],
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time from starting a streamed call to its first delta",
+    ["provider", "model"], buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by providers; streams count deltas as output tokens",
+    ["provider", "model", "kind"],
+)
+
+
+def model_label(model: str) -> str:
+    # Mock models carry their settings after '?'; those must not become separate series
+    return model.partition("?")[0]
+
+
+def record_llm_tokens(provider: str, model: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+    if input_tokens:
+        LLM_TOKENS.labels(provider, model_label(model), "input").inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels(provider, model_label(model), "output").inc(output_tokens)
+
+
+@asynccontextmanager
+async def observe_llm_call(provider: str, model: str, mode: str):
+    """Time a provider call and count it as ok, error or cancelled (the client went away)."""
+    labels = (provider.lower(), model_label(model), mode)
+    started = time.perf_counter()
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        LLM_REQUESTS.labels(*labels, "cancelled").inc()
+        raise
+    except BaseException:
+        LLM_REQUESTS.labels(*labels, "error").inc()
+        raise
+    else:
+        LLM_REQUESTS.labels(*labels, "ok").inc()
+    finally:
+        LLM_REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def observe_cache(cache: str, operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        CACHE_OPERATION_DURATION.labels(cache, operation).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
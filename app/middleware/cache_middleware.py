@@ -1,69 +1,255 @@
+import hashlib
+import json
 import logging
+import math
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from uuid import UUID
+
 from fastapi import Request
-from fastapi.responses import JSONResponse, Response
-from fastapi.encoders import jsonable_encoder
-from starlette.types import Message
-from app.cache.redis_cache import get_cache, set_cache, generate_cache_key, redis_client
-import json
+from fastapi.responses import Response
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from app.cache.redis_cache import redis_client
+from app.db.database import AsyncSessionLocal
+from app.metrics import CACHE_REQUESTS, observe_cache
+from app.models.project import Project
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-async def cache_middleware(request: Request, call_next):
-    logger.debug(f"Processing request: {request.method} {request.url.path}")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# XFetch beta: values above 1 refresh hot entries earlier, 0 disables early refresh
+RESPONSE_CACHE_BETA = float(os.getenv("RESPONSE_CACHE_BETA", "1.0"))
+PROJECT_SLUG_TTL = int(os.getenv("PROJECT_SLUG_TTL", "300"))
 
-    if request.url.path.startswith("/docs") or request.url.path.startswith("/openapi.json"):
-        logger.debug("Skipping cache for documentation endpoints")
-        return await call_next(request)
+CACHEABLE_PREFIXES = ("/v1/prompts", "/v1/collections", "/v1/projects", "/v1/search")
+# POST endpoints that only read, and so must not invalidate anything
+READ_ONLY_POST_SUFFIXES = (":resolve", "/render", "/render/bulk")
+# GET endpoints that stream: exports too large to buffer into a cache entry, and change feeds that never end
+UNCACHED_GET_SUFFIXES = ("/export", "/changes")
 
-    if request.method == "GET":
-        cache_key = generate_cache_key(request.url.path, dict(request.query_params))
-        logger.debug(f"Generated cache key: {cache_key}")
+# Response headers stored alongside the body and replayed on hits
+CACHED_HEADERS = ("x-next-cursor",)
 
-        cached_response = await get_cache(cache_key)
-        if cached_response:
-            logger.debug("Cache hit, returning cached response")
-            return JSONResponse(content=json.loads(cached_response))
+# Every cached key embeds one or two of these counters; a write bumps them instead of deleting keys,
+# which orphans the old entries in O(1) and leaves them to expire on their TTL.
+GLOBAL_GENERATION = "pn:gen:all"
+PROJECTS_GENERATION = "pn:gen:projects"
 
-    response = await call_next(request)
-    logger.debug(f"Received response from next middleware/route handler. Status: {response.status_code}")
+response_cache_stats = {"hits": 0, "misses": 0, "not_modified": 0, "early_refreshes": 0, "errors": 0}
+
+
+def project_generation(project_id: str) -> str:
+    return f"pn:gen:project:{project_id}"
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    response_cache_stats["not_modified"] += 1
+    return Response(status_code=304, headers={"ETag": etag, "X-Cache": "HIT"})
+
+
+async def resolve_project_id(project_id_or_slug: str) -> Optional[str]:
+    """Map a project slug to its id, via Redis first and the database on a miss."""
+    try:
+        return str(UUID(project_id_or_slug))
+    except ValueError:
+        pass
+
+    generation = await redis_client.get(PROJECTS_GENERATION) or b"0"
+    slug_key = f"pn:project-slug:{generation.decode()}:{project_id_or_slug}"
+    cached = await redis_client.get(slug_key)
+    if cached:
+        return cached.decode()
+
+    async with AsyncSessionLocal() as db:
+        project_id = await db.scalar(select(Project.id).where(Project.slug == project_id_or_slug))
+    if project_id is None:
+        return None
+    await redis_client.setex(slug_key, PROJECT_SLUG_TTL, str(project_id))
+    return str(project_id)
+
+
+async def request_scope(request: Request) -> Optional[Tuple[str, Dict[str, str], List[str]]]:
+    """
+    Canonicalise a request to (path, query params, generation keys).
+
+    Slugs are replaced by ids so `?project_slug=` and `?project_id=` requests share one entry.
+    Returns None when the project can't be resolved; such requests bypass the cache.
+    """
+    path = request.url.path
+    params = dict(request.query_params)
+
+    if path.startswith("/v1/projects"):
+        segments = path.rstrip("/").split("/")
+        if len(segments) > 3:
+            project_id = await resolve_project_id(segments[3])
+            if project_id is None:
+                return None
+            segments[3] = project_id
+            path = "/".join(segments)
+        return path, params, [GLOBAL_GENERATION, PROJECTS_GENERATION]
 
-    if request.method == "GET" and response.status_code == 200:
-        cache_key = generate_cache_key(request.url.path, dict(request.query_params))
+    project_id = params.pop("project_id", None)
+    project_slug = params.pop("project_slug", None)
+    if project_id or project_slug:
+        project_id = await resolve_project_id(project_id or project_slug)
+    if project_id is None:
+        return None
+    params["project_id"] = project_id
+    return path, params, [GLOBAL_GENERATION, project_generation(project_id)]
 
-        response_body = [chunk async for chunk in response.body_iterator]
-        response.body_iterator = iter(response_body)
 
-        body = b''.join(response_body)
+async def write_generations(request: Request) -> List[str]:
+    """Generation keys a write request invalidates, resolved before the write can delete the project."""
+    path = request.url.path
 
+    if path.startswith("/v1/projects"):
+        generations = [PROJECTS_GENERATION]
+        segments = path.rstrip("/").split("/")
+        if len(segments) > 3:
+            project_id = await resolve_project_id(segments[3])
+            if project_id:
+                generations.append(project_generation(project_id))
+        return generations
+
+    project_ref = request.query_params.get("project_id") or request.query_params.get("project_slug")
+    project_id = await resolve_project_id(project_ref) if project_ref else None
+    # Writes that name their project only in the body can't be scoped from here
+    return [project_generation(project_id) if project_id else GLOBAL_GENERATION]
+
+
+async def bump_generations(generations: List[str]) -> None:
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for generation in generations:
+            pipe.incr(generation)
+        await pipe.execute()
+    logger.debug(f"Bumped cache generations: {generations}")
+
+
+def should_refresh_early(delta: float, expiry: float) -> bool:
+    # Probabilistic early expiration (XFetch): the closer to expiry and the slower the
+    # recompute, the more likely one request refreshes the entry before it lapses for everyone.
+    if RESPONSE_CACHE_BETA <= 0:
+        return False
+    return time.time() - delta * RESPONSE_CACHE_BETA * math.log(random.random() or 1e-12) >= expiry
+
+
+async def cache_middleware(request: Request, call_next):
+    path = request.url.path
+    if not RESPONSE_CACHE_ENABLED or not path.startswith(CACHEABLE_PREFIXES):
+        return await call_next(request)
+
+    if request.method == "POST" and path.endswith(READ_ONLY_POST_SUFFIXES):
+        return await call_next(request)
+
+    if request.method in ["POST", "PUT", "PATCH", "DELETE"]:
         try:
-            json_content = json.loads(body)
-            await set_cache(cache_key, json.dumps(jsonable_encoder(json_content)), 3600)
-            logger.debug(f"Cached response for key: {cache_key}")
-        except json.JSONDecodeError:
-            logger.warning("Response body is not valid JSON, not caching")
-
-        # Create a new response with updated headers
-        new_response = Response(
-            content=body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type
+            generations = await write_generations(request)
+        except (RedisError, OSError) as e:
+            generations = [GLOBAL_GENERATION]
+            logger.warning(f"Could not resolve cache scope for write: {e}")
+        response = await call_next(request)
+        if response.status_code < 400:
+            try:
+                await bump_generations(generations)
+            except (RedisError, OSError) as e:
+                response_cache_stats["errors"] += 1
+                logger.warning(f"Cache invalidation failed: {e}")
+        return response
+
+    if request.method != "GET" or path.endswith(UNCACHED_GET_SUFFIXES):
+        return await call_next(request)
+
+    try:
+        scope = await request_scope(request)
+    except (RedisError, OSError) as e:
+        scope = None
+        response_cache_stats["errors"] += 1
+        logger.warning(f"Response cache unavailable, serving uncached: {e}")
+    if scope is None:
+        return await call_next(request)
+
+    try:
+        canonical_path, params, generation_keys = scope
+        generations = await redis_client.mget(generation_keys)
+        generation_tag = ".".join((g or b"0").decode() for g in generations)
+        canonical = f"{canonical_path}?{urlencode(sorted(params.items()))}#{generation_tag}"
+        cache_key = f"pn:resp:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+        async with observe_cache("response", "lookup"):
+            entry = await redis_client.hgetall(cache_key)
+    except (RedisError, OSError) as e:
+        response_cache_stats["errors"] += 1
+        CACHE_REQUESTS.labels("response", "error").inc()
+        logger.warning(f"Response cache unavailable, serving uncached: {e}")
+        return await call_next(request)
+
+    if entry and not should_refresh_early(float(entry[b"delta"]), float(entry[b"expiry"])):
+        response_cache_stats["hits"] += 1
+        CACHE_REQUESTS.labels("response", "hit").inc()
+        etag = entry[b"etag"].decode()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = json.loads(entry.get(b"headers", b"{}"))
+        return Response(
+            content=entry[b"body"],
+            media_type=entry[b"media_type"].decode(),
+            headers={**headers, "ETag": etag, "X-Cache": "HIT"},
         )
-        new_response.headers['Content-Length'] = str(len(body))
-        return new_response
 
-    elif request.method in ["POST", "PUT", "DELETE"] and response.status_code < 400:
-        base_path = "/".join(request.url.path.split("/")[:3])
-        logger.debug(f"Invalidating cache for base path: {base_path}")
+    if entry:
+        response_cache_stats["early_refreshes"] += 1
+    response_cache_stats["misses"] += 1
+    CACHE_REQUESTS.labels("response", "miss").inc()
+
+    # Handlers key per-worker caches by it, so this entry is only filled from reads of this generation
+    request.state.response_cache_generation = generation_tag
+    started = time.time()
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    delta = time.time() - started
+    etag = make_etag(body)
+    media_type = response.media_type or response.headers.get("content-type", "application/json")
 
-        async for key in redis_client.scan_iter(f"{base_path}*"):
-            await redis_client.delete(key)
-            logger.debug(f"Invalidated cache key: {key}")
+    try:
+        async with observe_cache("response", "store"), redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(cache_key, mapping={
+                "body": body,
+                "etag": etag,
+                "media_type": media_type,
+                "headers": json.dumps({k: v for k, v in response.headers.items() if k.lower() in CACHED_HEADERS}),
+                "delta": delta,
+                "expiry": time.time() + RESPONSE_CACHE_TTL,
+            })
+            pipe.expire(cache_key, RESPONSE_CACHE_TTL)
+            await pipe.execute()
+    except (RedisError, OSError) as e:
+        response_cache_stats["errors"] += 1
+        logger.warning(f"Failed to store cached response: {e}")
 
-        if len(request.url.path.split("/")) > 3:
-            list_cache_key = generate_cache_key(base_path, {})
-            await redis_client.delete(list_cache_key)
-            logger.debug(f"Invalidated list cache key: {list_cache_key}")
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
-    return response
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers.update({"ETag": etag, "X-Cache": "MISS"})
+    return Response(content=body, status_code=200, headers=headers, media_type=media_type)
@@ -0,0 +1,84 @@
+import logging
+import time
+
+from fastapi import Request
+from starlette.routing import Match
+
+from app.db.instrumentation import QUERY_BUDGET, QUERY_DEBUG, QueryStats, request_query_stats
+from app.metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_REPEATED_QUERIES,
+    DB_TIME_PER_REQUEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Scrapes shouldn't show up in the latency they report
+EXCLUDED_PATHS = ("/metrics",)
+
+
+def route_label(request: Request) -> str:
+    # Label by route template, not raw path, so ids and slugs don't each become a series
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+
+def report_queries(method: str, route: str, stats: QueryStats) -> None:
+    repeated = stats.repeated()
+    if repeated:
+        DB_REPEATED_QUERIES.labels(route).inc()
+        statement, n = repeated[0]
+        logger.warning(f"Possible N+1 in {method} {route}: statement ran {n} times: {' '.join(statement.split())[:200]}")
+    if stats.over_budget():
+        logger.warning(f"{method} {route} ran {stats.count} queries, over the budget of {QUERY_BUDGET}")
+
+
+async def metrics_middleware(request: Request, call_next):
+    if request.url.path in EXCLUDED_PATHS:
+        return await call_next(request)
+
+    method, route = request.method, route_label(request)
+    stats = QueryStats()
+    token = request_query_stats.set(stats)
+    in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+    in_progress.inc()
+    started = time.perf_counter()
+
+    def observe(status: int) -> None:
+        in_progress.dec()
+        HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+        DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+        DB_TIME_PER_REQUEST.labels(route).observe(stats.duration)
+        report_queries(method, route, stats)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        observe(500)
+        raise
+    finally:
+        request_query_stats.reset(token)
+
+    if QUERY_DEBUG:
+        # Queries made while a streaming body is sent come after the headers and aren't included
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["X-Query-Time-Ms"] = f"{stats.duration * 1000:.1f}"
+        response.headers["X-Query-Repeated"] = str(sum(n for _, n in stats.repeated()))
+
+    # Streaming responses do their work while the body is sent, so time through the last chunk
+    body_iterator = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            observe(response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
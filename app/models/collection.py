@@ -1,23 +1,27 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Table, ForeignKey
+from sqlalchemy import Column, String, DateTime, Table, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.db.database import Base
+from app.db.database import Base, DB_LAZY_LOAD
 
 collection_prompt = Table('collection_prompt', Base.metadata,
-    Column('collection_id', UUID(as_uuid=True), ForeignKey('collections.id')),
-    Column('prompt_id', UUID(as_uuid=True), ForeignKey('prompts.id'))
+    Column('collection_id', UUID(as_uuid=True), ForeignKey('collections.id'), primary_key=True),
+    Column('prompt_id', UUID(as_uuid=True), ForeignKey('prompts.id'), primary_key=True)
 )
 
 class Collection(Base):
     __tablename__ = "collections"
+    __table_args__ = (
+        Index("ix_collections_project_id_slug", "project_id", "slug"),
+        Index("ix_collections_project_id_created_at_id", "project_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True)
     slug = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    prompts = relationship("Prompt", secondary=collection_prompt, back_populates="collections")
+    prompts = relationship("Prompt", secondary=collection_prompt, back_populates="collections", lazy=DB_LAZY_LOAD)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"))
-    project = relationship("Project", back_populates="collections")
+    project = relationship("Project", back_populates="collections", lazy=DB_LAZY_LOAD)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Computed, String, Integer, DateTime, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+class ContentBlob(Base):
+    """Prompt text stored once per distinct content, keyed by its SHA-256."""
+    __tablename__ = "content_blobs"
+    __table_args__ = (
+        Index("ix_content_blobs_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    hash = Column(String(64), primary_key=True)
+    content = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)))
@@ -1,17 +1,20 @@
 import uuid
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.db.database import Base
+from app.db.database import Base, DB_LAZY_LOAD
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True)
     slug = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    prompts = relationship("Prompt", back_populates="project", cascade="all, delete-orphan")
-    collections = relationship("Collection", back_populates="project", cascade="all, delete-orphan")
+    prompts = relationship("Prompt", back_populates="project", cascade="all, delete-orphan", lazy=DB_LAZY_LOAD)
+    collections = relationship("Collection", back_populates="project", cascade="all, delete-orphan", lazy=DB_LAZY_LOAD)
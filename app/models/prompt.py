@@ -1,22 +1,34 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Enum
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, String, DateTime, Enum, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.sql.schema import ForeignKey
-from app.db.database import Base
+from app.db.database import Base, DB_LAZY_LOAD
 from app.models.collection import collection_prompt
 
 class Prompt(Base):
     __tablename__ = "prompts"
+    __table_args__ = (
+        Index("ix_prompts_project_id_slug", "project_id", "slug"),
+        Index("ix_prompts_project_id_created_at_id", "project_id", "created_at", "id"),
+        Index("ix_prompts_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True)
     slug = Column(String, index=True)
     description = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    versions = relationship("Version", back_populates="prompt", cascade="all, delete-orphan")
-    collections = relationship("Collection", secondary=collection_prompt, back_populates="prompts")
+    versions = relationship("Version", back_populates="prompt", cascade="all, delete-orphan", lazy=DB_LAZY_LOAD)
+    collections = relationship("Collection", secondary=collection_prompt, back_populates="prompts", lazy=DB_LAZY_LOAD)
     template_format = Column(Enum('f-string', 'jinja2', name='template_format'), nullable=False, default='f-string')
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"))
-    project = relationship("Project", back_populates="prompts")
+    project = relationship("Project", back_populates="prompts", lazy=DB_LAZY_LOAD)
+    # Maintained by Postgres for /v1/search; never loaded with the prompt
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', replace(coalesce(slug, ''), '-', ' ')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
@@ -1,13 +1,16 @@
 import uuid
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from app.db.database import Base
+from app.db.database import Base, DB_LAZY_LOAD
 
 class Tag(Base):
     __tablename__ = "tags"
+    __table_args__ = (
+        Index("ix_tags_version_id_name", "version_id", "name"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True)  # No unique constraint
     version_id = Column(UUID(as_uuid=True), ForeignKey("versions.id"))
-    version = relationship("Version", back_populates="tags")
+    version = relationship("Version", back_populates="tags", lazy=DB_LAZY_LOAD)
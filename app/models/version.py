@@ -1,17 +1,26 @@
 import uuid
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Index, select
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
-from app.db.database import Base
+from app.db.database import Base, DB_LAZY_LOAD
+from app.models.content_blob import ContentBlob
 
 class Version(Base):
     __tablename__ = "versions"
+    __table_args__ = (
+        Index("ix_versions_prompt_id_version_number", "prompt_id", "version_number", unique=True),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     prompt_id = Column(UUID(as_uuid=True), ForeignKey("prompts.id"))
     version_number = Column(Integer)
-    content = Column(String)
-    prompt = relationship("Prompt", back_populates="versions")
-    tags = relationship("Tag", back_populates="version", cascade="all, delete-orphan")
+    # Text lives in content_blobs, shared by every version with the same content.
+    # Write through app.services.content_store; `content` is read-only.
+    content_hash = Column(String(64), ForeignKey("content_blobs.hash"), index=True)
+    content = column_property(
+        select(ContentBlob.content).where(ContentBlob.hash == content_hash).scalar_subquery()
+    )
+    prompt = relationship("Prompt", back_populates="versions", lazy=DB_LAZY_LOAD)
+    tags = relationship("Tag", back_populates="version", cascade="all, delete-orphan", lazy=DB_LAZY_LOAD)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
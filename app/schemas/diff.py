@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from uuid import UUID
+from enum import Enum
+
+class DiffFormat(str, Enum):
+    unified = "unified"
+    structured = "structured"
+    changes = "changes"
+
+class DiffGranularity(str, Enum):
+    line = "line"
+    word = "word"
+
+class DiffOp(BaseModel):
+    op: str  # equal, insert, delete or replace
+    from_start: int
+    from_end: int
+    to_start: int
+    to_end: int
+    from_text: List[str]
+    to_text: List[str]
+
+class DiffResponse(BaseModel):
+    id: UUID
+    from_version: int
+    to_version: int
+    format: DiffFormat
+    granularity: DiffGranularity
+    identical: bool
+    additions: int
+    deletions: int
+    unified: Optional[str] = None
+    ops: Optional[List[DiffOp]] = None
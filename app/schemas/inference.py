@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class InferenceRequest(BaseModel):
     prompt_content: str
@@ -17,3 +17,23 @@ class InferenceStreamResponse(BaseModel):
     chunk: str
     model: str
     provider: str
+
+class BatchInferenceRequest(BaseModel):
+    prompt_content: str
+    inputs: List[str]
+    model: str = "gpt-4o-mini-2024-07-18"
+    provider: str = "openai"
+    stream: bool = True
+
+class BatchInferenceResult(BaseModel):
+    index: int
+    output: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchInferenceJob(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    completed: int
+    error: Optional[str] = None
+    results: List[BatchInferenceResult] = []
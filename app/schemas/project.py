@@ -23,3 +23,10 @@ class ProjectInDB(ProjectBase):
 
 class ProjectResponse(ProjectInDB):
     pass
+
+class ProjectImportResponse(BaseModel):
+    project: ProjectResponse
+    prompts_created: int
+    versions_created: int
+    versions_skipped: int
+    collections: int
@@ -4,6 +4,8 @@ from uuid import UUID
 from datetime import datetime
 from enum import Enum
 
+from app.schemas.version import VersionResponse
+
 class TemplateFormat(str, Enum):
     f_string = "f-string"
     jinja2 = "jinja2"
@@ -45,3 +47,15 @@ class PromptResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+class PromptReference(BaseModel):
+    prompt: str  # id or slug
+    tag: Optional[str] = None
+    version: Optional[int] = None
+
+class PromptResolveRequest(BaseModel):
+    items: List[PromptReference]
+
+class PromptResolution(PromptReference):
+    result: Optional[VersionResponse] = None
+    error: Optional[str] = None
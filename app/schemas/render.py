@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+class RenderRequest(BaseModel):
+    variables: Dict[str, Any] = {}
+    version: Optional[int] = None
+    tag: Optional[str] = None
+
+class RenderResponse(BaseModel):
+    id: UUID
+    version: int
+    output: str
+
+class BulkRenderRequest(BaseModel):
+    rows: List[Dict[str, Any]]
+    version: Optional[int] = None
+    tag: Optional[str] = None
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from uuid import UUID
+from enum import Enum
+
+class SearchContentScope(str, Enum):
+    none = "none"      # names, slugs and descriptions only
+    latest = "latest"  # also the content of each prompt's latest version
+    all = "all"        # also the content of every version
+
+class SearchResult(BaseModel):
+    id: UUID
+    slug: str
+    name: str
+    description: Optional[str]
+    score: float
+    matched: List[str]  # fields that matched: prompt, content
+    version: Optional[int] = None  # best matching version, when content matched
+    highlights: Dict[str, str] = {}
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError, WatchError
+
+from app.cache.redis_cache import redis_client
+from app.metrics import observe_llm_call
+from app.services.llm_registry import LLMProvider, build_prompt, llm_registry
+
+logger = logging.getLogger(__name__)
+
+# In-flight requests allowed per (provider, model) in each worker, shared by every batch it runs.
+# INFERENCE_MAX_CONCURRENCY_<PROVIDER> overrides the default for one provider.
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "8"))
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "10000"))
+INFERENCE_JOB_TTL = int(os.getenv("INFERENCE_JOB_TTL", "86400"))
+# A running job refreshes its heartbeat this often. One whose heartbeat is older than the timeout
+# lost its worker (restarted, killed or drained) and is reported failed.
+INFERENCE_JOB_HEARTBEAT = float(os.getenv("INFERENCE_JOB_HEARTBEAT", "10"))
+INFERENCE_JOB_HEARTBEAT_TIMEOUT = float(os.getenv("INFERENCE_JOB_HEARTBEAT_TIMEOUT", "60"))
+
+ABANDONED_JOB_ERROR = "The worker running this job stopped before it finished"
+
+_semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+# Strong references to running jobs; asyncio only keeps weak ones
+_running_jobs: Set[asyncio.Task] = set()
+
+
+def provider_semaphore(provider: str, model: str) -> asyncio.Semaphore:
+    key = (provider.lower(), model)
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        limit = int(os.getenv(f"INFERENCE_MAX_CONCURRENCY_{key[0].upper()}", INFERENCE_MAX_CONCURRENCY))
+        semaphore = _semaphores[key] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+async def _generate(
+    llm_provider: LLMProvider, provider: str, semaphore: asyncio.Semaphore, prompt: str, model: str
+) -> Dict:
+    async with semaphore:
+        try:
+            async with observe_llm_call(provider, model, "batch"):
+                return {"output": await llm_provider.generate(prompt, model)}
+        except Exception as e:
+            logger.warning(f"Batch inference item failed: {e}")
+            return {"error": str(e) or type(e).__name__}
+
+
+async def run_batch(prompt_content: str, inputs: List[str], model: str, provider: str) -> AsyncGenerator[Dict, None]:
+    """
+    Run every input against the prompt and yield `{"index", "output" | "error"}` in completion order.
+
+    Identical inputs are generated once and reported under each of their indices.
+    Pending calls are cancelled if the consumer stops early.
+    """
+    llm_provider = llm_registry.get_provider(provider)
+    semaphore = provider_semaphore(provider, model)
+
+    indices: Dict[str, List[int]] = {}
+    for index, user_input in enumerate(inputs):
+        indices.setdefault(user_input, []).append(index)
+
+    tasks = {
+        asyncio.ensure_future(_generate(llm_provider, provider, semaphore, build_prompt(prompt_content, user_input), model)): user_input
+        for user_input in indices
+    }
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                for index in indices[tasks[task]]:
+                    yield {"index": index, **result}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def job_key(job_id: str) -> str:
+    return f"pn:inference-job:{job_id}"
+
+
+def job_results_key(job_id: str) -> str:
+    return f"pn:inference-job:{job_id}:results"
+
+
+async def _heartbeat(key: str) -> None:
+    while True:
+        await asyncio.sleep(INFERENCE_JOB_HEARTBEAT)
+        try:
+            await redis_client.hset(key, "heartbeat_at", time.time())
+        except (RedisError, OSError) as e:
+            logger.warning(f"Could not refresh heartbeat of {key}: {e}")
+
+
+async def _run_job(job_id: str, prompt_content: str, inputs: List[str], model: str, provider: str) -> None:
+    key, results_key = job_key(job_id), job_results_key(job_id)
+    status = "failed"
+    # Results can be minutes apart, so the heartbeat doesn't wait for them
+    heartbeat = asyncio.create_task(_heartbeat(key))
+    try:
+        async for result in run_batch(prompt_content, inputs, model, provider):
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.rpush(results_key, json.dumps(result))
+                pipe.hincrby(key, "completed", 1)
+                pipe.expire(results_key, INFERENCE_JOB_TTL)
+                await pipe.execute()
+        status = "completed"
+    except Exception as e:
+        logger.error(f"Batch inference job {job_id} failed: {e}")
+    finally:
+        heartbeat.cancel()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"status": status, "finished_at": time.time()})
+            pipe.expire(key, INFERENCE_JOB_TTL)
+            await pipe.execute()
+
+
+async def start_job(prompt_content: str, inputs: List[str], model: str, provider: str) -> str:
+    """Record a batch job in Redis and run it in the background of this worker."""
+    llm_registry.get_provider(provider)  # fail fast on unknown providers
+    job_id = uuid.uuid4().hex
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(job_key(job_id), mapping={
+            "status": "running",
+            "total": len(inputs),
+            "completed": 0,
+            "model": model,
+            "provider": provider,
+            "created_at": time.time(),
+            "heartbeat_at": time.time(),
+        })
+        pipe.expire(job_key(job_id), INFERENCE_JOB_TTL)
+        await pipe.execute()
+
+    task = asyncio.create_task(_run_job(job_id, prompt_content, inputs, model, provider))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+    return job_id
+
+
+def _heartbeat_lapsed(job: Dict[bytes, bytes]) -> bool:
+    # Jobs started before heartbeats were recorded fall back to their start time
+    heartbeat_at = float(job.get(b"heartbeat_at") or job.get(b"created_at") or 0)
+    return time.time() - heartbeat_at > INFERENCE_JOB_HEARTBEAT_TIMEOUT
+
+
+async def _fail_abandoned(job_id: str) -> None:
+    """Mark a running job failed if its heartbeat has lapsed, unless it finishes meanwhile."""
+    key = job_key(job_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            job = await pipe.hgetall(key)
+            if not job or job[b"status"] != b"running" or not _heartbeat_lapsed(job):
+                return
+            pipe.multi()
+            pipe.hset(key, mapping={"status": "failed", "error": ABANDONED_JOB_ERROR, "finished_at": time.time()})
+            await pipe.execute()
+            logger.warning(f"Batch inference job {job_id} lost its worker; marked failed")
+        except WatchError:
+            pass
+
+
+async def get_job(job_id: str, offset: int = 0) -> Optional[Dict]:
+    """
+    Job status plus the results recorded from `offset` on, or None for unknown or expired jobs.
+
+    A running job whose heartbeat has lapsed is marked failed here, so clients stop polling it.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hgetall(job_key(job_id))
+        pipe.lrange(job_results_key(job_id), offset, -1)
+        job, results = await pipe.execute()
+    if not job:
+        return None
+    if job[b"status"] == b"running" and _heartbeat_lapsed(job):
+        await _fail_abandoned(job_id)
+        job = await redis_client.hgetall(job_key(job_id)) or job
+    return {
+        "job_id": job_id,
+        "status": job[b"status"].decode(),
+        "total": int(job[b"total"]),
+        "completed": int(job[b"completed"]),
+        "error": job[b"error"].decode() if b"error" in job else None,
+        "results": [json.loads(result) for result in results],
+    }
@@ -0,0 +1,236 @@
+"""
+Project change feed.
+
+Writes append an event to their project's Redis stream once they commit. Each worker runs one
+reader that blocks on the streams of the projects it has subscribers for and hands new events to
+them, so Redis sees one connection per worker however many clients are listening. Stream entry ids
+are the events' cursors: they only increase, and a client that reconnects with one is first
+replayed what it missed, as far back as its project's stream is retained. Replay reads only that
+project's events, however busy other projects are.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from redis.exceptions import RedisError
+
+from app.cache.redis_cache import blocking_redis_client, redis_client
+from app.metrics import CHANGE_FEED_SUBSCRIBERS
+from app.services.stream_registry import stream_registry
+from app.services.streaming import sse_event
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_STREAM = "pn:changes"
+# Events kept for replay per project; older ones are trimmed as new ones arrive
+CHANGE_FEED_MAXLEN = int(os.getenv("CHANGE_FEED_MAXLEN", "10000"))
+# How long a deleted project's stream stays readable, so its subscribers can catch the deletion
+DELETED_PROJECT_FEED_TTL = 86400
+# Seconds between keep-alive comments on an idle subscription
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+# Events a slow subscriber may fall behind by before it is disconnected to resume from its cursor
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000"))
+
+REPLAY_PAGE_SIZE = 1000
+
+
+def project_stream(project_id) -> str:
+    return f"{CHANGE_FEED_STREAM}:{project_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """Order stream ids ("<ms>-<seq>"); raises ValueError for anything else."""
+    ms, _, seq = cursor.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def publish_change(project_id: UUID, event: str, **fields) -> None:
+    """Append an event for the project's subscribers. Best effort: a Redis failure is logged, not raised."""
+    data = json.dumps({"event": event, "project_id": str(project_id), **fields}, default=str)
+    stream = project_stream(project_id)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xadd(stream, {"event": event, "data": data}, maxlen=CHANGE_FEED_MAXLEN, approximate=True)
+            if event == "project.deleted":
+                pipe.expire(stream, DELETED_PROJECT_FEED_TTL)
+            await pipe.execute()
+    except (RedisError, OSError) as e:
+        logger.warning(f"Could not publish {event} for project {project_id}: {e}")
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        self.overflowed = False
+        self.closed = False
+
+    def deliver(self, entry: Tuple[str, str, str]) -> None:
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self) -> None:
+        # Wakes a reader waiting on an empty queue; a full one is checked between entries anyway
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class ChangeHub:
+    """Per-worker fan-out of project change streams to subscribers, keyed by project id."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        # Last entry read from each subscribed project's stream
+        self._cursors: Dict[str, str] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def subscribe(self, project_id: UUID) -> Subscriber:
+        project = str(project_id)
+        if project not in self._cursors:
+            # Start from the newest entry, so nothing published after this call is missed
+            newest = await redis_client.xrevrange(project_stream(project), count=1)
+            if project not in self._cursors:
+                self._cursors[project] = newest[0][0].decode() if newest else "0-0"
+                # A reader blocked on the other projects' streams wouldn't see this one until it woke.
+                # Its cursors only advance past entries it has delivered, so restarting loses nothing.
+                await self._stop_reader()
+        subscriber = Subscriber()
+        self._subscribers.setdefault(project, set()).add(subscriber)
+        CHANGE_FEED_SUBSCRIBERS.inc()
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+        return subscriber
+
+    def unsubscribe(self, project_id: UUID, subscriber: Subscriber) -> None:
+        subscribers = self._subscribers.get(str(project_id))
+        if subscribers is not None and subscriber in subscribers:
+            subscribers.discard(subscriber)
+            CHANGE_FEED_SUBSCRIBERS.dec()
+            if not subscribers:
+                del self._subscribers[str(project_id)]
+                self._cursors.pop(str(project_id), None)
+
+    async def _read(self) -> None:
+        # Runs while anyone in this worker is subscribed
+        while self._subscribers:
+            streams = {project_stream(project): cursor for project, cursor in self._cursors.items()}
+            try:
+                response = await blocking_redis_client.xread(
+                    streams, count=REPLAY_PAGE_SIZE, block=int(CHANGE_FEED_HEARTBEAT * 1000)
+                )
+            except (RedisError, OSError) as e:
+                logger.warning(f"Change feed read failed, retrying: {e}")
+                await asyncio.sleep(1)
+                continue
+            for stream, entries in response or []:
+                project = stream.decode()[len(CHANGE_FEED_STREAM) + 1:]
+                for entry_id, fields in entries:
+                    entry_id = entry_id.decode()
+                    if project in self._cursors:
+                        self._cursors[project] = entry_id
+                    for subscriber in list(self._subscribers.get(project, ())):
+                        subscriber.deliver((entry_id, fields[b"event"].decode(), fields[b"data"].decode()))
+
+    async def _stop_reader(self) -> None:
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        self._reader = None
+
+    async def aclose(self) -> None:
+        await self._stop_reader()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "projects": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+        }
+
+
+change_hub = ChangeHub()
+
+
+async def replay(project_id: UUID, cursor: str) -> AsyncGenerator[Tuple[str, str, str], None]:
+    """Yield the project's retained events after `cursor`, oldest first."""
+    stream = project_stream(project_id)
+    start = cursor
+    while True:
+        entries: List = await redis_client.xrange(stream, min=start, count=REPLAY_PAGE_SIZE)
+        for entry_id, fields in entries:
+            entry_id = entry_id.decode()
+            if entry_id != cursor:
+                yield entry_id, fields[b"event"].decode(), fields[b"data"].decode()
+        if len(entries) < REPLAY_PAGE_SIZE:
+            return
+        start = entries[-1][0].decode()
+        cursor = start
+
+
+async def change_events(request: Request, project_id: UUID, cursor: Optional[str]) -> AsyncGenerator[str, None]:
+    """
+    SSE stream of a project's changes, resuming after `cursor` when one is given.
+
+    A `reset` event with reason "trimmed" means events after the cursor may be gone, so the client
+    should re-read whatever state it tracks. One with reason "lagging" ends the stream of a client
+    that fell too far behind, and one with reason "shutdown" that of a worker that is stopping;
+    reconnecting with the last event id resumes without loss.
+    """
+    try:
+        subscriber = await change_hub.subscribe(project_id)
+    except (RedisError, OSError) as e:
+        logger.warning(f"Change feed unavailable: {e}")
+        yield sse_event(json.dumps({"error": "Change feed unavailable"}), event="error")
+        return
+    try:
+        # Clients resume from their cursor on another worker, so a stopping worker closes these at once
+        with stream_registry.track("changes", subscriber.close, resumable=True):
+            if cursor is not None:
+                try:
+                    # Entries are only trimmed once the stream is full, so an older cursor is just early
+                    oldest = await redis_client.xrange(project_stream(project_id), count=1)
+                    if oldest and parse_cursor(oldest[0][0].decode()) > parse_cursor(cursor) \
+                            and await redis_client.xlen(project_stream(project_id)) >= CHANGE_FEED_MAXLEN:
+                        yield sse_event(json.dumps({"reason": "trimmed"}), event="reset")
+                    async for entry_id, event, data in replay(project_id, cursor):
+                        cursor = entry_id
+                        yield sse_event(data, event=event, event_id=entry_id)
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Change feed replay failed: {e}")
+                    yield sse_event(json.dumps({"error": "Change feed unavailable"}), event="error")
+                    return
+
+            while True:
+                if subscriber.closed:
+                    yield sse_event(json.dumps({"reason": "shutdown"}), event="reset")
+                    return
+                try:
+                    entry = await asyncio.wait_for(subscriber.queue.get(), timeout=CHANGE_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if entry is None:
+                    continue
+                entry_id, event, data = entry
+                # Entries the replay already sent can also arrive live
+                if cursor is not None and parse_cursor(entry_id) <= parse_cursor(cursor):
+                    continue
+                cursor = entry_id
+                yield sse_event(data, event=event, event_id=entry_id)
+                if subscriber.overflowed and subscriber.queue.empty():
+                    yield sse_event(json.dumps({"reason": "lagging"}), event="reset")
+                    return
+    finally:
+        change_hub.unsubscribe(project_id, subscriber)
@@ -0,0 +1,25 @@
+import hashlib
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.content_blob import ContentBlob
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+async def store_content(db: AsyncSession, content: str) -> str:
+    """
+    Store `content` unless an identical blob already exists, and return its hash.
+
+    Runs in the caller's transaction, so the blob commits (or rolls back) with the version that uses it.
+    """
+    digest = content_hash(content)
+    await db.execute(
+        insert(ContentBlob)
+        .values(hash=digest, content=content, size=len(content.encode()))
+        .on_conflict_do_nothing(index_elements=[ContentBlob.hash])
+    )
+    return digest
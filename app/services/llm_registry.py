@@ -1,15 +1,65 @@
+import asyncio
+import hashlib
 import json
+import logging
+import math
 import os
+import random
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Type, AsyncGenerator, Any, Coroutine
-from openai import AsyncOpenAI
-from anthropic import Anthropic
+from contextlib import aclosing
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Type, AsyncGenerator, Any, Coroutine
+from urllib.parse import parse_qsl
+import time
+
+from app.metrics import LLM_TIME_TO_FIRST_TOKEN, model_label, observe_llm_call, record_llm_tokens
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+# Model aliases per provider; defaults to the file shipped next to this module
+LLM_REGISTRY_PATH = os.getenv("LLM_REGISTRY_PATH", str(Path(__file__).with_name("llm_registry.json")))
+
+# HTTP connection pool shared by all requests to one provider, per worker
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+# Open a connection to each configured provider at startup so the first request skips TCP/TLS setup
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
 
-def load_model_registry(file_path: str = 'llm_registry.json') -> Dict:
+# Local stand-in provider for load tests and offline CI; never calls out to the network
+MOCK_LLM_ENABLED = os.getenv("MOCK_LLM_ENABLED", "false").lower() == "true"
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "200"))
+MOCK_LLM_LATENCY_DISTRIBUTION = os.getenv("MOCK_LLM_LATENCY_DISTRIBUTION", "lognormal")
+MOCK_LLM_LATENCY_SIGMA = float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5"))
+MOCK_LLM_TOKENS_PER_SECOND = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50"))
+MOCK_LLM_RESPONSE_TOKENS = int(os.getenv("MOCK_LLM_RESPONSE_TOKENS", "100"))
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+
+# httpx and the provider SDKs are imported when a provider is first created, not with this module:
+# together they add most of a second to every process start.
+def create_http_client() -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+    )
+
+def load_model_registry(file_path: str = LLM_REGISTRY_PATH) -> Dict:
     try:
         with open(file_path, 'r') as f:
             return json.load(f)
@@ -28,6 +78,10 @@ def load_model_registry(file_path: str = 'llm_registry.json') -> Dict:
         }
 
 class LLMProvider(ABC):
+    # Providers are long-lived: one instance, and one connection pool, per worker
+    http_client: Optional["httpx.AsyncClient"] = None
+    base_url: Optional[str] = None
+
     @abstractmethod
     async def generate(self, prompt: str, model: str) -> str:
         pass
@@ -36,9 +90,22 @@ class LLMProvider(ABC):
     async def stream(self, prompt: str, model: str) -> AsyncGenerator[str, None]:
         pass
 
+    async def warmup(self) -> None:
+        # Any response will do; the point is to leave an open connection in the pool
+        if self.http_client is not None and self.base_url:
+            await self.http_client.head(self.base_url)
+
+    async def aclose(self) -> None:
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
 class OpenAIProvider(LLMProvider):
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        from openai import AsyncOpenAI
+
+        self.http_client = create_http_client()
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=self.http_client)
+        self.base_url = str(self.client.base_url)
 
     async def generate(self, prompt: str, model: str) -> str:
         try:
@@ -49,6 +116,8 @@ class OpenAIProvider(LLMProvider):
                     {"role": "user", "content": prompt}
                 ]
             )
+            if response.usage is not None:
+                record_llm_tokens("openai", model, response.usage.prompt_tokens, response.usage.completion_tokens)
             return response.choices[0].message.content or ""  # Handle None case
         except Exception as e:
             print(f"Error in OpenAI API call: {str(e)}")
@@ -65,61 +134,163 @@ class OpenAIProvider(LLMProvider):
                 stream=True
             )
 
-            async for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            # Closing the stream releases the upstream connection as soon as the consumer stops
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
         except Exception as e:
             print(f"Error in OpenAI streaming API call: {str(e)}")
             raise
 
 class AnthropicProvider(LLMProvider):
     def __init__(self):
-        self.client = Anthropic(api_key=ANTHROPIC_API_KEY)
+        from anthropic import AsyncAnthropic
+
+        self.http_client = create_http_client()
+        self.client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=self.http_client)
+        self.base_url = str(self.client.base_url)
 
     async def generate(self, prompt: str, model: str) -> str:
         try:
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=model,
                 max_tokens=1024,
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             )
+            record_llm_tokens("anthropic", model, response.usage.input_tokens, response.usage.output_tokens)
             # Handle the response content properly
-            return str(response.content[0].value) if response.content else ""
+            return "".join(block.text for block in response.content if block.type == "text")
         except Exception as e:
             print(f"Error in Anthropic API call: {str(e)}")
             raise
 
     async def stream(self, prompt: str, model: str) -> AsyncGenerator[str, None]:
         try:
-            with self.client.messages.stream(
+            async with self.client.messages.stream(
                 model=model,
                 max_tokens=1024,
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             ) as stream:
-                async for chunk in stream:
-                    if chunk.type == "content_block_delta" and chunk.delta.text:
-                        yield chunk.delta.text
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
         except Exception as e:
             print(f"Error in Anthropic streaming API call: {str(e)}")
             raise
 
+class MockProvider(LLMProvider):
+    """
+    Simulated provider with tunable latency, speed, size and failure rate.
+
+    Defaults come from the MOCK_LLM_* settings. A model name may override them per request with
+    query-style parameters, e.g. `mock?latency_ms=50&tps=200&tokens=400&error_rate=0.01&distribution=fixed`.
+    `latency_ms` is the time to first token (the median, for random distributions).
+    """
+    WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+    def profile(self, model: str) -> Dict[str, Any]:
+        overrides = dict(parse_qsl(model.partition("?")[2]))
+        return {
+            "latency_ms": float(overrides.get("latency_ms", MOCK_LLM_LATENCY_MS)),
+            "distribution": overrides.get("distribution", MOCK_LLM_LATENCY_DISTRIBUTION),
+            "sigma": float(overrides.get("sigma", MOCK_LLM_LATENCY_SIGMA)),
+            "tps": float(overrides.get("tps", MOCK_LLM_TOKENS_PER_SECOND)),
+            "tokens": int(overrides.get("tokens", MOCK_LLM_RESPONSE_TOKENS)),
+            "error_rate": float(overrides.get("error_rate", MOCK_LLM_ERROR_RATE)),
+        }
+
+    @staticmethod
+    def first_token_delay(profile: Dict[str, Any]) -> float:
+        latency = profile["latency_ms"] / 1000
+        if profile["distribution"] == "fixed":
+            return latency
+        if profile["distribution"] == "uniform":
+            return random.uniform(0, 2 * latency)
+        if profile["distribution"] == "exponential":
+            return random.expovariate(1 / latency) if latency > 0 else 0
+        # lognormal: latency is the median, sigma sets the tail
+        return latency * math.exp(random.gauss(0, profile["sigma"]))
+
+    def tokens(self, prompt: str, count: int):
+        # Deterministic per prompt, so cached and fresh responses can be compared
+        seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+        return [self.WORDS[(seed + i) % len(self.WORDS)] + " " for i in range(count)]
+
+    def maybe_fail(self, profile: Dict[str, Any]) -> None:
+        if profile["error_rate"] and random.random() < profile["error_rate"]:
+            raise RuntimeError("Mock provider injected failure")
+
+    async def generate(self, prompt: str, model: str) -> str:
+        profile = self.profile(model)
+        generating = profile["tokens"] / profile["tps"] if profile["tps"] > 0 else 0
+        await asyncio.sleep(self.first_token_delay(profile) + generating)
+        self.maybe_fail(profile)
+        record_llm_tokens("mock", model, len(prompt.split()), profile["tokens"])
+        return "".join(self.tokens(prompt, profile["tokens"]))
+
+    async def stream(self, prompt: str, model: str) -> AsyncGenerator[str, None]:
+        profile = self.profile(model)
+        interval = 1 / profile["tps"] if profile["tps"] > 0 else 0
+        await asyncio.sleep(self.first_token_delay(profile))
+        for i, token in enumerate(self.tokens(prompt, profile["tokens"])):
+            if i:
+                await asyncio.sleep(interval)
+            # Failures land mid-stream, where they are hardest to handle
+            if i == profile["tokens"] // 2:
+                self.maybe_fail(profile)
+            yield token
+
 class LLMRegistry:
     def __init__(self):
         self.providers: Dict[str, Type[LLMProvider]] = {
             "openai": OpenAIProvider,
             "anthropic": AnthropicProvider,
         }
+        self.api_keys: Dict[str, Optional[str]] = {
+            "openai": OPENAI_API_KEY,
+            "anthropic": ANTHROPIC_API_KEY,
+        }
         self.model_registry = load_model_registry()
+        if MOCK_LLM_ENABLED:
+            self.providers["mock"] = MockProvider
+            self.model_registry["mock"] = {"mock": "mock"}
+        self._instances: Dict[str, LLMProvider] = {}
 
     def get_provider(self, provider_name: str) -> LLMProvider:
-        provider_class = self.providers.get(provider_name.lower())
-        if not provider_class:
-            raise ValueError(f"Unknown provider: {provider_name}")
-        return provider_class()
+        provider_name = provider_name.lower()
+        provider = self._instances.get(provider_name)
+        if provider is None:
+            provider_class = self.providers.get(provider_name)
+            if not provider_class:
+                raise ValueError(f"Unknown provider: {provider_name}")
+            provider = self._instances[provider_name] = provider_class()
+        return provider
+
+    async def startup(self) -> None:
+        """Create the providers that have credentials configured and, optionally, open their connections."""
+        configured = []
+        for name in self.providers:
+            if name in self.api_keys and not self.api_keys[name]:
+                continue
+            try:
+                configured.append(self.get_provider(name))
+            except Exception as e:
+                logger.warning(f"Could not initialise provider {name}: {e}")
+
+        if LLM_WARMUP and configured:
+            results = await asyncio.gather(*(provider.warmup() for provider in configured), return_exceptions=True)
+            for provider, result in zip(configured, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Warmup failed for {type(provider).__name__}: {result}")
+
+    async def aclose(self) -> None:
+        providers, self._instances = list(self._instances.values()), {}
+        await asyncio.gather(*(provider.aclose() for provider in providers), return_exceptions=True)
 
     def get_models(self, provider: Optional[str] = None) -> Dict[str, Dict[str, str]]:
         if provider:
@@ -131,20 +302,40 @@ class LLMRegistry:
 
 llm_registry = LLMRegistry()
 
+# Returned (or streamed) in place of a completion when the provider call fails
+LLM_ERROR_MESSAGE = "An error occurred while generating the response."
+
+def build_prompt(prompt_content: str, user_input: str) -> str:
+    # Combine the prompt content with the user input
+    return f"{prompt_content}\n\nUser: {user_input}"
+
 async def call_llm_api(prompt: str, model: str, provider: str) -> str:
     try:
         llm_provider = llm_registry.get_provider(provider)
-        result = await llm_provider.generate(prompt, model)
+        async with observe_llm_call(provider, model, "generate"):
+            result = await llm_provider.generate(prompt, model)
         return result or "No response generated."
     except Exception as e:
         print(f"Error calling LLM API: {str(e)}")
-        return "An error occurred while generating the response."
+        return LLM_ERROR_MESSAGE
 
 async def stream_llm_api(prompt: str, model: str, provider: str) -> AsyncGenerator[str, None]:
     try:
         llm_provider = llm_registry.get_provider(provider)
-        async for chunk in await llm_provider.stream(prompt, model):
-            yield chunk
+        started = time.perf_counter()
+        deltas = 0
+        async with observe_llm_call(provider, model, "stream"), aclosing(llm_provider.stream(prompt, model)) as chunks:
+            try:
+                async for chunk in chunks:
+                    if not deltas:
+                        LLM_TIME_TO_FIRST_TOKEN.labels(provider.lower(), model_label(model)).observe(
+                            time.perf_counter() - started
+                        )
+                    deltas += 1
+                    yield chunk
+            finally:
+                # Streams don't report usage; one delta is roughly one token
+                record_llm_tokens(provider.lower(), model, output_tokens=deltas)
     except Exception as e:
         print(f"Error streaming from LLM API: {str(e)}")
-        yield "An error occurred while generating the response."
+        yield LLM_ERROR_MESSAGE
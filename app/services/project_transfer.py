@@ -0,0 +1,368 @@
+"""
+Project export and import as newline-delimited JSON.
+
+An export is one `project` record followed by each prompt's `prompt` record and its `version`
+records in version order, then one `collection` record per collection. Versions carry their
+content and tag names; ids are not exported, so an export can be imported into any database.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import AsyncSessionLocal
+from app.models.collection import Collection, collection_prompt
+from app.models.content_blob import ContentBlob
+from app.models.project import Project
+from app.models.prompt import Prompt
+from app.models.tag import Tag
+from app.models.version import Version
+from app.schemas.prompt import TemplateFormat
+from app.services.content_store import content_hash
+from app.services.versioning import move_tag
+
+EXPORT_FORMAT = 1
+# Rows fetched per round trip from the server-side cursor while exporting
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Records buffered before they are written while importing
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+TEMPLATE_FORMATS = tuple(template_format.value for template_format in TemplateFormat)
+
+
+def _line(record: Dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False).encode() + b"\n"
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+async def export_project(project_id: UUID) -> AsyncIterator[bytes]:
+    """
+    Yield a project as NDJSON, one batch of lines at a time.
+
+    Rows are read through server-side cursors, so memory stays flat however large the project is.
+    Runs in its own session because the response is streamed after the request's session has closed.
+    """
+    async with AsyncSessionLocal() as db:
+        project = await db.scalar(select(Project).where(Project.id == project_id))
+        if project is None:
+            return
+        yield _line({
+            "type": "project", "format": EXPORT_FORMAT, "slug": project.slug, "name": project.name,
+            "description": project.description,
+        })
+
+        tags = select(func.array_agg(aggregate_order_by(Tag.name, Tag.name))).where(
+            Tag.version_id == Version.id
+        ).scalar_subquery()
+        stmt = select(
+            Prompt.id, Prompt.slug, Prompt.name, Prompt.description, Prompt.template_format, Prompt.created_at,
+            Version.version_number, Version.created_at.label("version_created_at"), ContentBlob.content,
+            tags.label("tags"),
+        ).outerjoin(Version, Version.prompt_id == Prompt.id).outerjoin(
+            ContentBlob, ContentBlob.hash == Version.content_hash
+        ).where(Prompt.project_id == project_id).order_by(
+            Prompt.created_at, Prompt.id, Version.version_number
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        current_prompt = None
+        async for rows in (await db.stream(stmt)).partitions():
+            lines = []
+            for row in rows:
+                if row.id != current_prompt:
+                    current_prompt = row.id
+                    lines.append(_line({
+                        "type": "prompt", "slug": row.slug, "name": row.name, "description": row.description,
+                        "template_format": row.template_format, "created_at": _timestamp(row.created_at),
+                    }))
+                if row.version_number is not None:
+                    lines.append(_line({
+                        "type": "version", "prompt": row.slug, "version": row.version_number,
+                        "content": row.content, "tags": row.tags or [],
+                        "created_at": _timestamp(row.version_created_at),
+                    }))
+            yield b"".join(lines)
+
+        prompt_slugs = select(func.array_agg(aggregate_order_by(Prompt.slug, Prompt.slug))).join(
+            collection_prompt, collection_prompt.c.prompt_id == Prompt.id
+        ).where(collection_prompt.c.collection_id == Collection.id).scalar_subquery()
+        stmt = select(
+            Collection.slug, Collection.name, Collection.description, Collection.created_at,
+            prompt_slugs.label("prompts"),
+        ).where(Collection.project_id == project_id).order_by(
+            Collection.created_at, Collection.id
+        ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        async for rows in (await db.stream(stmt)).partitions():
+            yield b"".join(_line({
+                "type": "collection", "slug": row.slug, "name": row.name, "description": row.description,
+                "prompts": row.prompts or [], "created_at": _timestamp(row.created_at),
+            }) for row in rows)
+
+
+async def read_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Dict]]:
+    """Parse an NDJSON byte stream into (line number, record), skipping blank lines."""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, _parse(line_number, line)
+    if buffer.strip():
+        yield line_number + 1, _parse(line_number + 1, buffer)
+
+
+def _parse(line_number: int, line: bytes) -> Dict:
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Line {line_number}: invalid JSON ({e})")
+    if not isinstance(record, dict) or "type" not in record:
+        raise HTTPException(status_code=400, detail=f"Line {line_number}: expected an object with a 'type'")
+    return record
+
+
+def _created_at(line_number: int, record: Dict) -> datetime:
+    value = record.get("created_at")
+    if not value:
+        return datetime.now(timezone.utc)
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Line {line_number}: invalid created_at {value!r}")
+
+
+def _names(line_number: int, record: Dict, field: str) -> List[str]:
+    names = record.get(field) or []
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise HTTPException(status_code=400, detail=f"Line {line_number}: {field} must be a list of names")
+    return names
+
+
+class ProjectImport:
+    """
+    Write an export's records into a project in batches, in the caller's transaction.
+
+    Prompts are matched by slug: missing ones are created, existing ones keep their name and
+    description and only gain the versions they don't already have, with any tags those carry
+    moved onto them. Version numbers, tags and timestamps are kept as exported.
+    """
+
+    def __init__(self, db: AsyncSession, project: Project):
+        self.db = db
+        self.project = project
+        self.prompt_ids: Dict[str, UUID] = {}
+        # Version numbers already present in prompts that existed before the import
+        self.existing_versions: Dict[UUID, Set[int]] = {}
+        # Version numbers written by this import, with the line each came from
+        self.imported_versions: Dict[UUID, Dict[int, int]] = {}
+        self.prompts: List[Tuple[int, Dict]] = []
+        self.versions: List[Tuple[int, Dict]] = []
+        self.collections: List[Tuple[int, Dict]] = []
+        self.stats = {"prompts_created": 0, "versions_created": 0, "versions_skipped": 0, "collections": 0}
+
+    async def add(self, line_number: int, record: Dict) -> None:
+        kind = record["type"]
+        if kind in ("prompt", "collection") and not isinstance(record.get("slug"), str):
+            raise HTTPException(status_code=400, detail=f"Line {line_number}: {kind} needs a slug")
+        if kind == "prompt":
+            self.prompts.append((line_number, record))
+        elif kind == "version":
+            self.versions.append((line_number, record))
+        elif kind == "collection":
+            self.collections.append((line_number, record))
+        else:
+            raise HTTPException(status_code=400, detail=f"Line {line_number}: unexpected '{kind}' record")
+        if len(self.prompts) + len(self.versions) + len(self.collections) >= IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self) -> None:
+        # Prompts come before their versions and collections in an export, so writing in this order
+        # means every reference in a batch resolves to a prompt from this batch or an earlier one.
+        await self._write_prompts()
+        await self._write_versions()
+        await self._write_collections()
+
+    async def _write_prompts(self) -> None:
+        records = {
+            record["slug"]: (line_number, record)
+            for line_number, record in self.prompts if record["slug"] not in self.prompt_ids
+        }
+        self.prompts = []
+        if not records:
+            return
+
+        # Existing prompts are locked like any other version write, see app.services.versioning
+        existing = (await self.db.execute(select(Prompt.slug, Prompt.id).where(
+            Prompt.project_id == self.project.id, Prompt.slug.in_(records)
+        ).with_for_update())).all()
+        for slug, prompt_id in existing:
+            self.prompt_ids[slug] = prompt_id
+            self.existing_versions[prompt_id] = set()
+        if existing:
+            for prompt_id, version_number in (await self.db.execute(select(Version.prompt_id, Version.version_number).where(
+                Version.prompt_id.in_([prompt_id for _, prompt_id in existing])
+            ))).all():
+                self.existing_versions[prompt_id].add(version_number)
+
+        rows = []
+        for slug, (line_number, record) in records.items():
+            if slug in self.prompt_ids:
+                continue
+            template_format = record.get("template_format") or TemplateFormat.f_string.value
+            if template_format not in TEMPLATE_FORMATS:
+                raise HTTPException(
+                    status_code=400, detail=f"Line {line_number}: unknown template_format {template_format!r}"
+                )
+            self.prompt_ids[slug] = uuid.uuid4()
+            rows.append({
+                "id": self.prompt_ids[slug], "slug": slug, "name": record.get("name", slug),
+                "description": record.get("description"),
+                "template_format": template_format,
+                "created_at": _created_at(line_number, record), "project_id": self.project.id,
+            })
+        if rows:
+            await self.db.execute(insert(Prompt), rows)
+            self.stats["prompts_created"] += len(rows)
+
+    async def _write_versions(self) -> None:
+        records, self.versions = self.versions, []
+        if not records:
+            return
+
+        blobs = {}
+        versions = []
+        tags = []
+        # Tags on versions added to existing prompts move from wherever they are now
+        moved_tags = []
+        for line_number, record in records:
+            prompt_id = self.prompt_ids.get(record.get("prompt"))
+            if prompt_id is None:
+                raise HTTPException(
+                    status_code=400, detail=f"Line {line_number}: version of unknown prompt '{record.get('prompt')}'"
+                )
+            number = record.get("version")
+            if not isinstance(number, int) or not isinstance(record.get("content"), str):
+                raise HTTPException(status_code=400, detail=f"Line {line_number}: version needs a number and content")
+            tag_names = _names(line_number, record, "tags")
+            if number in self.existing_versions.get(prompt_id, ()):
+                self.stats["versions_skipped"] += 1
+                continue
+            imported = self.imported_versions.setdefault(prompt_id, {})
+            if number in imported:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Line {line_number}: version {number} of '{record['prompt']}' already given on line {imported[number]}",
+                )
+            imported[number] = line_number
+
+            digest = content_hash(record["content"])
+            blobs[digest] = record["content"]
+            version_id = uuid.uuid4()
+            versions.append({
+                "id": version_id, "prompt_id": prompt_id, "version_number": number,
+                "content_hash": digest, "created_at": _created_at(line_number, record),
+            })
+            if prompt_id in self.existing_versions:
+                moved_tags.extend((prompt_id, name, version_id) for name in tag_names)
+            else:
+                tags.extend({"id": uuid.uuid4(), "name": name, "version_id": version_id} for name in tag_names)
+
+        # Skipping blobs that already exist saves computing their search vectors only to discard them
+        if blobs:
+            for digest in (await self.db.scalars(select(ContentBlob.hash).where(ContentBlob.hash.in_(blobs)))).all():
+                del blobs[digest]
+        if blobs:
+            await self.db.execute(insert(ContentBlob).on_conflict_do_nothing(index_elements=[ContentBlob.hash]), [
+                {"hash": digest, "content": content, "size": len(content.encode())}
+                for digest, content in blobs.items()
+            ])
+        if versions:
+            await self.db.execute(insert(Version), versions)
+            self.stats["versions_created"] += len(versions)
+        if tags:
+            await self.db.execute(insert(Tag), tags)
+        for prompt_id, name, version_id in moved_tags:
+            await move_tag(self.db, prompt_id, name, version_id)
+
+    async def _write_collections(self) -> None:
+        records, self.collections = self.collections, []
+        if not records:
+            return
+
+        await self.db.execute(insert(Collection).on_conflict_do_nothing(index_elements=[Collection.slug]), [{
+            "id": uuid.uuid4(), "slug": record["slug"], "name": record.get("name", record["slug"]),
+            "description": record.get("description"), "created_at": _created_at(line_number, record),
+            "project_id": self.project.id,
+        } for line_number, record in records])
+        collections = {slug: (collection_id, project_id) for slug, collection_id, project_id in (
+            await self.db.execute(select(Collection.slug, Collection.id, Collection.project_id).where(
+                Collection.slug.in_([record["slug"] for _, record in records])
+            ))
+        ).all()}
+
+        members = []
+        for line_number, record in records:
+            collection_id, project_id = collections[record["slug"]]
+            if project_id != self.project.id:
+                raise HTTPException(
+                    status_code=409, detail=f"Line {line_number}: collection '{record['slug']}' belongs to another project"
+                )
+            for slug in _names(line_number, record, "prompts"):
+                if slug not in self.prompt_ids:
+                    raise HTTPException(
+                        status_code=400, detail=f"Line {line_number}: collection member '{slug}' is not a known prompt"
+                    )
+                members.append({"collection_id": collection_id, "prompt_id": self.prompt_ids[slug]})
+        if members:
+            await self.db.execute(insert(collection_prompt).on_conflict_do_nothing(), members)
+        self.stats["collections"] += len(records)
+
+
+async def import_project(
+    db: AsyncSession, project_id_or_slug: str, records: AsyncIterator[Tuple[int, Dict]]
+) -> Tuple[Project, Dict[str, int]]:
+    """
+    Import an NDJSON export into the project named by `project_id_or_slug`, creating it from the
+    export's project record if it doesn't exist. Nothing is committed unless every record is valid.
+    """
+    try:
+        line_number, header = await records.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Nothing to import")
+    if header["type"] != "project" or header.get("format") != EXPORT_FORMAT:
+        raise HTTPException(status_code=400, detail=f"Line {line_number}: expected a format {EXPORT_FORMAT} project record")
+
+    try:
+        project = await db.scalar(select(Project).where(Project.id == UUID(project_id_or_slug)))
+    except ValueError:
+        project = await db.scalar(select(Project).where(Project.slug == project_id_or_slug))
+        if project is None:
+            project = Project(
+                slug=project_id_or_slug, name=header.get("name") or project_id_or_slug,
+                description=header.get("description"),
+            )
+            db.add(project)
+            await db.flush()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    importer = ProjectImport(db, project)
+    async for line_number, record in records:
+        await importer.add(line_number, record)
+    await importer.flush()
+    await db.commit()
+    await db.refresh(project)
+    return project, importer.stats
@@ -0,0 +1,122 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Options for ts_headline; fragments are delimited so clients can render them however they like
+SEARCH_HIGHLIGHT_OPTIONS = os.getenv(
+    "SEARCH_HIGHLIGHT_OPTIONS", "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+)
+
+# Prompt matches come from the weighted name/slug/description vector plus a fuzzy match on name
+# and slug; content matches from the deduplicated blob vectors, so each distinct text is searched
+# once however many versions share it. Each prompt is ranked by its prompt score plus its best
+# content score, and only the returned page is highlighted.
+SEARCH_QUERY = """
+    WITH query AS (SELECT websearch_to_tsquery('english', :q) AS tsq, websearch_to_tsquery('simple', :q) AS simple_tsq),
+    prompt_hits AS (
+        SELECT p.id AS prompt_id,
+               ts_rank_cd(p.search_vector, query.tsq || query.simple_tsq) + {fuzzy_score} AS score
+        FROM prompts p, query
+        WHERE p.project_id = :project_id
+          AND (p.search_vector @@ (query.tsq || query.simple_tsq) OR {fuzzy_match})
+    ),
+    content_hits AS ({content_hits}),
+    ranked AS (
+        SELECT coalesce(ph.prompt_id, ch.prompt_id) AS prompt_id,
+               coalesce(ph.score, 0) + coalesce(ch.score, 0) AS score,
+               ph.prompt_id IS NOT NULL AS prompt_matched,
+               ch.version_number, ch.content_hash
+        FROM prompt_hits ph FULL JOIN content_hits ch ON ch.prompt_id = ph.prompt_id
+        ORDER BY score DESC, prompt_id
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT r.prompt_id, r.score, r.prompt_matched, r.version_number, p.slug, p.name, p.description,
+           CASE WHEN r.prompt_matched
+                THEN ts_headline('simple', p.name, query.tsq || query.simple_tsq, :highlight) END AS name_highlight,
+           CASE WHEN r.prompt_matched AND p.description IS NOT NULL
+                THEN ts_headline('english', p.description, query.tsq, :highlight) END AS description_highlight,
+           CASE WHEN r.content_hash IS NOT NULL
+                THEN ts_headline('english', b.content, query.tsq, :highlight) END AS content_highlight
+    FROM ranked r
+    JOIN prompts p ON p.id = r.prompt_id
+    LEFT JOIN content_blobs b ON b.hash = r.content_hash
+    CROSS JOIN query
+    ORDER BY r.score DESC, r.prompt_id
+"""
+
+NO_CONTENT_HITS = """
+        SELECT NULL::uuid AS prompt_id, NULL::int AS version_number, NULL::varchar AS content_hash, 0::real AS score
+        WHERE false
+"""
+
+# Latest versions are found from the project's prompts and their blobs probed by key, which stays
+# cheap even for terms that appear in nearly every blob. LIMIT 1 keeps the planner from flattening
+# the probe into a scan of the blob index, whose row estimate it can't know for a parameter.
+LATEST_CONTENT_HITS = """
+        SELECT v.prompt_id, v.version_number, v.content_hash, ts_rank_cd(b.search_vector, query.tsq) AS score
+        FROM query, prompts p
+        JOIN versions v ON v.prompt_id = p.id
+        JOIN tags t ON t.version_id = v.id AND t.name = 'latest'
+        CROSS JOIN LATERAL (
+            SELECT search_vector FROM content_blobs WHERE hash = v.content_hash LIMIT 1
+        ) b
+        WHERE p.project_id = :project_id AND b.search_vector @@ query.tsq
+"""
+
+# Across all versions the blob index does the matching; each prompt keeps its best version
+ALL_CONTENT_HITS = """
+        SELECT DISTINCT ON (v.prompt_id) v.prompt_id, v.version_number, v.content_hash,
+               ts_rank_cd(b.search_vector, query.tsq) AS score
+        FROM query, content_blobs b
+        JOIN versions v ON v.content_hash = b.hash
+        JOIN prompts p ON p.id = v.prompt_id AND p.project_id = :project_id
+        WHERE b.search_vector @@ query.tsq
+        ORDER BY v.prompt_id, score DESC, v.version_number DESC
+"""
+
+CONTENT_HITS = {"none": NO_CONTENT_HITS, "latest": LATEST_CONTENT_HITS, "all": ALL_CONTENT_HITS}
+
+TRIGRAM_FUZZY = ("(:q <% p.name OR :q <% p.slug)", "greatest(word_similarity(:q, p.name), word_similarity(:q, p.slug))")
+SUBSTRING_FUZZY = ("(p.name ILIKE :pattern OR p.slug ILIKE :pattern)", "0")
+
+
+class PromptSearch:
+    """Ranked full-text and fuzzy search over a project's prompts."""
+
+    def __init__(self):
+        self._trigram: Optional[bool] = None
+
+    async def has_trigram(self, db: AsyncSession) -> bool:
+        # Checked once per worker; the migration skips pg_trgm where the server doesn't ship it
+        if self._trigram is None:
+            self._trigram = bool(await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")))
+            if not self._trigram:
+                logger.warning("pg_trgm is not installed; search falls back to substring matching on names")
+        return self._trigram
+
+    async def search(
+        self, db: AsyncSession, project_id: UUID, q: str, content_scope: str, limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        fuzzy_match, fuzzy_score = TRIGRAM_FUZZY if await self.has_trigram(db) else SUBSTRING_FUZZY
+        statement = text(SEARCH_QUERY.format(
+            fuzzy_match=fuzzy_match, fuzzy_score=fuzzy_score, content_hits=CONTENT_HITS[content_scope]
+        ))
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = (await db.execute(statement, {
+            "q": q,
+            "pattern": f"%{escaped}%",
+            "project_id": project_id,
+            "limit": limit,
+            "offset": offset,
+            "highlight": SEARCH_HIGHLIGHT_OPTIONS,
+        })).mappings().all()
+        return [dict(row) for row in rows]
+
+
+prompt_search = PromptSearch()
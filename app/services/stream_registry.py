@@ -0,0 +1,147 @@
+"""
+Graceful drain of streaming responses.
+
+When a worker is asked to stop, the server closes its listening socket and waits for in-flight
+requests before running the lifespan shutdown. Streams would hold that wait open, so the worker
+also tells them to finish:
+
+- Resumable streams (change feeds) end at once with a `reset` event. Their clients reconnect,
+  reach another worker and resume from their last event id.
+- Other streams (inference) run on for up to STREAM_DRAIN_TIMEOUT seconds. Any still running
+  then end with an `error` event rather than a dropped connection.
+- New streaming requests are refused with a 503, so clients retry against another worker.
+"""
+import asyncio
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Seconds in-flight streams may run on once the worker starts shutting down. Keep it below the
+# server's graceful shutdown timeout (gunicorn.conf.py derives one from the other).
+STREAM_DRAIN_TIMEOUT = float(os.getenv("STREAM_DRAIN_TIMEOUT", "25"))
+
+DRAIN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class TrackedStream:
+    def __init__(self, kind: str, on_stop: Callable[[], None], resumable: bool):
+        self.kind = kind
+        self.on_stop = on_stop
+        self.resumable = resumable
+        self.stopped = False
+
+    def stop(self) -> None:
+        if not self.stopped:
+            self.stopped = True
+            self.on_stop()
+
+
+class StreamRegistry:
+    """The worker's in-flight streaming responses, and whether it has started shutting down."""
+
+    def __init__(self, drain_timeout: float = STREAM_DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._streams: Set[TrackedStream] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._deadline: Optional[asyncio.TimerHandle] = None
+        self._handlers: Dict[int, Callable] = {}
+
+    def install(self) -> None:
+        """
+        Start draining when the process receives SIGTERM or SIGINT.
+
+        Called from the lifespan, after the server has installed its own handlers, which still run:
+        ours is chained in front of them.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        self._loop = asyncio.get_running_loop()
+        for sig in DRAIN_SIGNALS:
+            previous = signal.getsignal(sig)
+            handler = partial(self._on_signal, previous)
+            signal.signal(sig, handler)
+            self._handlers[sig] = handler
+
+    def uninstall(self) -> None:
+        for sig, handler in self._handlers.items():
+            # Put back the previous handler only if nobody has replaced ours since
+            if signal.getsignal(sig) is handler:
+                signal.signal(sig, handler.args[0])
+        self._handlers = {}
+        if self._deadline is not None:
+            self._deadline.cancel()
+            self._deadline = None
+
+    def _on_signal(self, previous, sig: int, frame) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.begin_drain)
+        if callable(previous):
+            previous(sig, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(sig, signal.SIG_DFL)
+            signal.raise_signal(sig)
+
+    def begin_drain(self) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        resumable = [stream for stream in self._streams if stream.resumable]
+        logger.info(
+            f"Draining {len(self._streams) - len(resumable)} stream(s) for up to {self.drain_timeout}s; "
+            f"closing {len(resumable)} resumable stream(s)"
+        )
+        for stream in resumable:
+            stream.stop()
+        if self._loop is not None:
+            self._deadline = self._loop.call_later(self.drain_timeout, self.stop_all)
+
+    def stop_all(self) -> None:
+        remaining = [stream for stream in self._streams if not stream.stopped]
+        if remaining:
+            logger.warning(f"Stopping {len(remaining)} stream(s) still running after {self.drain_timeout}s")
+        for stream in remaining:
+            stream.stop()
+
+    def check_accepting(self) -> None:
+        """Refuse a new streaming request once the worker is draining."""
+        if self.draining:
+            raise HTTPException(
+                status_code=503, detail="Server is shutting down",
+                headers={"Retry-After": "1", "Connection": "close"},
+            )
+
+    @contextmanager
+    def track(self, kind: str, on_stop: Callable[[], None], resumable: bool = False) -> Iterator[TrackedStream]:
+        """
+        Register a stream for the duration of the block.
+
+        `on_stop` is called at most once, when the stream should wrap up: it must make the stream
+        send its closing events and return promptly.
+        """
+        stream = TrackedStream(kind, on_stop, resumable)
+        self._streams.add(stream)
+        # Started after the drain began: a resumable stream ends at once, others run to the deadline
+        if self.draining and resumable:
+            stream.stop()
+        try:
+            yield stream
+        finally:
+            self._streams.discard(stream)
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for stream in self._streams:
+            counts[stream.kind] = counts.get(stream.kind, 0) + 1
+        return {"draining": int(self.draining), **counts}
+
+
+stream_registry = StreamRegistry()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+from fastapi import Request
+
+from app.services.llm_registry import LLM_ERROR_MESSAGE
+from app.services.stream_registry import stream_registry
+
+logger = logging.getLogger(__name__)
+
+# Deltas are buffered and written as one event once either limit is reached
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL", "0.05"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "512"))
+
+SHUTDOWN_MESSAGE = "Server is shutting down; retry the request."
+
+
+def sse_event(data: str, event: Optional[str] = None, event_id: Optional[Union[int, str]] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    # A newline inside data would end the field early; SSE joins consecutive data lines with "\n"
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def coalesce(
+    chunks: AsyncIterator[str],
+    flush_interval: float = SSE_FLUSH_INTERVAL,
+    flush_bytes: int = SSE_FLUSH_BYTES,
+    stop: Optional[asyncio.Event] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Merge small deltas into larger pieces.
+
+    The first delta is passed through at once so time to first token isn't delayed. After that a
+    piece is emitted once `flush_bytes` are buffered or `flush_interval` seconds have passed since
+    the oldest buffered delta, whether or not upstream has produced anything new. Setting `stop`
+    flushes what is buffered and ends the stream without waiting for upstream.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    first = True
+    next_chunk = asyncio.ensure_future(iterator.__anext__())
+    stopped = asyncio.ensure_future(stop.wait()) if stop is not None else None
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            waiting = {next_chunk} if stopped is None else {next_chunk, stopped}
+            done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if stopped is not None and stopped in done:
+                break
+            if not done:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            next_chunk = asyncio.ensure_future(iterator.__anext__())
+
+            buffer.append(chunk)
+            size += len(chunk.encode())
+            if first or size >= flush_bytes:
+                yield "".join(buffer)
+                buffer, size, deadline, first = [], 0, None, False
+            elif deadline is None:
+                deadline = loop.time() + flush_interval
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if stopped is not None and not stopped.done():
+            stopped.cancel()
+        # Cancelling the pending read unwinds the upstream generator, which closes the provider stream
+        if not next_chunk.done():
+            next_chunk.cancel()
+            try:
+                await next_chunk
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+def record_stream_metrics(metrics: Dict) -> None:
+    logger.info(
+        "Stream %(status)s: ttft=%(ttft_ms)sms deltas=%(deltas)s events=%(events)s "
+        "duration=%(duration_ms)sms tokens/s=%(tokens_per_second)s" % metrics
+    )
+
+
+async def sse_stream(
+    request: Request,
+    chunks: AsyncIterator[str],
+    on_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Turn a stream of text deltas into SSE events.
+
+    Deltas are coalesced into `message` events with increasing ids. The stream ends with a `done`
+    event carrying timing metrics, preceded by an `error` event if the provider failed. If the
+    client disconnects, the upstream stream is closed and nothing more is sent. If the worker is
+    shutting down and the drain deadline passes first, the stream ends with an `error` event and
+    a `done` event with status "interrupted". `on_complete` receives the full text of streams
+    that finish without error.
+    """
+    started = time.perf_counter()
+    metrics = {"status": "completed", "ttft_ms": None, "deltas": 0, "events": 0,
+               "duration_ms": None, "tokens_per_second": None}
+    failed = False
+    exhausted = False
+    output: List[str] = []
+    first_token_at: Optional[float] = None
+    stop = asyncio.Event()
+
+    async def metered() -> AsyncGenerator[str, None]:
+        nonlocal failed, exhausted, first_token_at
+        async with aclosing(chunks) as upstream:
+            async for chunk in upstream:
+                if chunk == LLM_ERROR_MESSAGE:
+                    failed = True
+                    return
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                metrics["deltas"] += 1
+                yield chunk
+        exhausted = True
+
+    def finish(status: str) -> Dict:
+        finished = time.perf_counter()
+        metrics["status"] = status
+        metrics["duration_ms"] = round((finished - started) * 1000, 1)
+        if first_token_at is not None:
+            metrics["ttft_ms"] = round((first_token_at - started) * 1000, 1)
+            generating = finished - first_token_at
+            # Deltas stand in for tokens: providers stream roughly one token per delta
+            if generating > 0:
+                metrics["tokens_per_second"] = round(metrics["deltas"] / generating, 1)
+        return metrics
+
+    try:
+        with stream_registry.track("inference", stop.set):
+            async with aclosing(coalesce(metered(), stop=stop)) as pieces:
+                async for piece in pieces:
+                    if await request.is_disconnected():
+                        metrics["status"] = "cancelled"
+                        break
+                    output.append(piece)
+                    metrics["events"] += 1
+                    yield sse_event(piece, event="message", event_id=metrics["events"])
+
+            if metrics["status"] == "cancelled":
+                return
+            if stop.is_set() and not exhausted and not failed:
+                yield sse_event(json.dumps({"error": SHUTDOWN_MESSAGE}), event="error")
+                yield sse_event(json.dumps(finish("interrupted")), event="done")
+                return
+            if failed:
+                yield sse_event(json.dumps({"error": LLM_ERROR_MESSAGE}), event="error")
+            yield sse_event(json.dumps(finish("failed" if failed else "completed")), event="done")
+
+        if on_complete is not None and not failed:
+            await on_complete("".join(output))
+    except (asyncio.CancelledError, GeneratorExit):
+        metrics["status"] = "cancelled"
+        raise
+    finally:
+        if metrics["duration_ms"] is None:
+            finish(metrics["status"])
+        record_stream_metrics(metrics)
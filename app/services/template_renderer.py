@@ -0,0 +1,199 @@
+import hashlib
+import os
+import re
+import string
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from jinja2 import FileSystemBytecodeCache, StrictUndefined, TemplateError
+from jinja2.exceptions import SecurityError
+from jinja2.sandbox import SandboxedEnvironment
+
+from app.cache.lru import LRUCache
+
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "1024"))
+# Compiled Jinja2 bytecode is shared by every worker on the host through this directory.
+# Unset, Jinja2 picks a per-user directory under the system temp dir.
+JINJA_BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR") or None
+
+# Bounds on the work a single render can do, so a hostile template fails with an error instead of
+# holding a worker thread or its memory
+MAX_RENDER_OUTPUT = int(os.getenv("MAX_RENDER_OUTPUT", str(1024 * 1024)))
+# Numbers that range() may produce in one render, summed over all its calls, so nested loops count
+JINJA_MAX_RANGE = int(os.getenv("JINJA_MAX_RANGE", "50000"))
+# Size of an integer that `*` or `**` may produce
+MAX_INT_BITS = 4096
+
+# What remains of the current render's range() allowance
+_range_budget: ContextVar[List[int]] = ContextVar("range_budget")
+
+
+class TemplateRenderError(ValueError):
+    pass
+
+
+class FStringTemplate:
+    """
+    `str.format`-style template restricted to plain named fields.
+
+    Attribute and index lookups (`{x.__class__}`, `{x[0]}`) and positional fields are
+    rejected at compile time, so a template can only read the variables it is given.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._formatter = string.Formatter()
+        self._parts: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        try:
+            parsed = list(self._formatter.parse(source))
+        except ValueError as e:
+            raise TemplateRenderError(f"Invalid f-string template: {e}")
+
+        for literal, field_name, format_spec, conversion in parsed:
+            if field_name is not None:
+                if not field_name.isidentifier():
+                    raise TemplateRenderError(f"Unsupported field '{{{field_name}}}': only plain variable names are allowed")
+                if format_spec and "{" in format_spec:
+                    raise TemplateRenderError(f"Nested format specs are not supported in '{{{field_name}}}'")
+                if conversion not in (None, "s", "r", "a"):
+                    raise TemplateRenderError(f"Unknown conversion '!{conversion}' in '{{{field_name}}}'")
+                # A width or precision alone could make one field as large as the allowed output
+                if format_spec and any(int(n) > MAX_RENDER_OUTPUT for n in re.findall(r"\d+", format_spec)):
+                    raise TemplateRenderError(f"Format spec too large in '{{{field_name}}}'")
+            self._parts.append((literal, field_name, format_spec or "", conversion))
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        out = []
+        for literal, field_name, format_spec, conversion in self._parts:
+            out.append(literal)
+            if field_name is None:
+                continue
+            if field_name not in variables:
+                raise TemplateRenderError(f"Missing variable '{field_name}'")
+            try:
+                value = self._formatter.convert_field(variables[field_name], conversion)
+                out.append(self._formatter.format_field(value, format_spec))
+            except (TypeError, ValueError) as e:
+                raise TemplateRenderError(f"Cannot format '{field_name}': {e}")
+        return join_bounded(out)
+
+
+def join_bounded(chunks: Iterable[str]) -> str:
+    out = []
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > MAX_RENDER_OUTPUT:
+            raise TemplateRenderError(f"Rendered output is longer than {MAX_RENDER_OUTPUT} characters")
+        out.append(chunk)
+    return "".join(out)
+
+
+class BoundedSandboxedEnvironment(SandboxedEnvironment):
+    """
+    SandboxedEnvironment that also bounds CPU and memory.
+
+    The stock sandbox only stops templates reaching unsafe attributes. This one also caps what
+    `*`, `**` and range() may build, and `JinjaTemplate.render` caps the output.
+    """
+
+    intercepted_binops = frozenset(["*", "**"])
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.globals["range"] = bounded_range
+
+    def call_binop(self, context, operator: str, left: Any, right: Any) -> Any:
+        if operator == "*":
+            for sequence, times in ((left, right), (right, left)):
+                if isinstance(sequence, (str, bytes, list, tuple)) and isinstance(times, int) \
+                        and len(sequence) * times > MAX_RENDER_OUTPUT:
+                    raise SecurityError(f"Repetition longer than {MAX_RENDER_OUTPUT} is not allowed")
+            if isinstance(left, int) and isinstance(right, int) \
+                    and left.bit_length() + right.bit_length() > MAX_INT_BITS:
+                raise SecurityError("Product is too large")
+        elif operator == "**":
+            if isinstance(left, int) and isinstance(right, int) and abs(left) > 1 \
+                    and left.bit_length() * right > MAX_INT_BITS:
+                raise SecurityError("Power is too large")
+        return super().call_binop(context, operator, left, right)
+
+
+def bounded_range(*args: int) -> range:
+    numbers = range(*args)
+    budget = _range_budget.get(None)
+    if budget is None:
+        budget = [JINJA_MAX_RANGE]
+    budget[0] -= len(numbers)
+    if budget[0] < 0:
+        raise SecurityError(f"range() may produce at most {JINJA_MAX_RANGE} numbers per render")
+    return numbers
+
+
+class JinjaTemplate:
+    def __init__(self, environment: BoundedSandboxedEnvironment, source: str, digest: str):
+        self.source = source
+        try:
+            self._template = _load_jinja(environment, source, digest)
+        except TemplateError as e:
+            raise TemplateRenderError(f"Invalid jinja2 template: {e}")
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        token = _range_budget.set([JINJA_MAX_RANGE])
+        try:
+            return join_bounded(self._template.generate(variables))
+        except TemplateRenderError:
+            raise
+        except Exception as e:  # template code can raise anything, e.g. ZeroDivisionError
+            raise TemplateRenderError(str(e))
+        finally:
+            _range_budget.reset(token)
+
+
+def _load_jinja(environment: BoundedSandboxedEnvironment, source: str, digest: str):
+    # Same steps as jinja2's BaseLoader.load, keyed by content hash instead of a file name,
+    # so a worker that has never seen this source can still skip parsing and compiling it.
+    bucket = environment.bytecode_cache.get_bucket(environment, digest, None, source)
+    code = bucket.code
+    if code is None:
+        code = environment.compile(source, digest)
+        bucket.code = code
+        environment.bytecode_cache.set_bucket(bucket)
+    return environment.template_class.from_code(environment, code, environment.make_globals(None))
+
+
+class TemplateRenderer:
+    """Compiles prompt templates once per content hash and renders them with caller-supplied variables."""
+
+    def __init__(self, cache_size: int = TEMPLATE_CACHE_SIZE, bytecode_cache_dir: Optional[str] = JINJA_BYTECODE_CACHE_DIR):
+        self._templates = LRUCache(maxsize=cache_size)
+        self.environment = BoundedSandboxedEnvironment(
+            undefined=StrictUndefined,
+            autoescape=False,
+            keep_trailing_newline=True,
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir),
+            cache_size=0,  # compiled templates are held in self._templates
+        )
+
+    def compile(self, source: str, template_format: str):
+        digest = hashlib.sha256(source.encode()).hexdigest()
+        key = (template_format, digest)
+        template = self._templates.get(key)
+        if template is None:
+            if template_format == "jinja2":
+                template = JinjaTemplate(self.environment, source, digest)
+            elif template_format == "f-string":
+                template = FStringTemplate(source)
+            else:
+                raise TemplateRenderError(f"Unknown template format '{template_format}'")
+            self._templates.set(key, template)
+        return template
+
+    def render(self, source: str, template_format: str, variables: Dict[str, Any]) -> str:
+        return self.compile(source, template_format).render(variables)
+
+    def stats(self) -> Dict[str, int]:
+        return self._templates.stats()
+
+
+template_renderer = TemplateRenderer()
@@ -0,0 +1,68 @@
+import difflib
+import os
+import re
+from typing import Any, Dict, List, NamedTuple
+
+from app.cache.lru import LRUCache
+
+DIFF_CACHE_SIZE = int(os.getenv("DIFF_CACHE_SIZE", "1024"))
+
+# Words, runs of whitespace and single punctuation marks, so joining the tokens restores the text
+WORD_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+class VersionDiff(NamedTuple):
+    identical: bool
+    additions: int
+    deletions: int
+    unified: str
+    ops: List[Dict[str, Any]]
+
+
+def tokenize(text: str, granularity: str) -> List[str]:
+    if granularity == "word":
+        return WORD_PATTERN.findall(text)
+    return text.splitlines(keepends=True)
+
+
+def compute_diff(old: str, new: str, granularity: str = "line", context: int = 3) -> VersionDiff:
+    """
+    Diff two texts by line or by word.
+
+    `ops` covers the whole text in order; equal runs carry their tokens once, in `from_text`.
+    `unified` is always line based and has no ---/+++ header, since the same pair of contents
+    can belong to different versions.
+    """
+    a, b = tokenize(old, granularity), tokenize(new, granularity)
+    # Prompts repeat lines (blank lines, list markers); autojunk would treat those as noise
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    ops, additions, deletions = [], 0, 0
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op != "equal":
+            deletions += i2 - i1
+            additions += j2 - j1
+        ops.append({
+            "op": op, "from_start": i1, "from_end": i2, "to_start": j1, "to_end": j2,
+            "from_text": a[i1:i2], "to_text": b[j1:j2] if op != "equal" else [],
+        })
+    unified = "\n".join(list(difflib.unified_diff(old.splitlines(), new.splitlines(), n=context, lineterm=""))[2:])
+    return VersionDiff(old == new, additions, deletions, unified, ops)
+
+
+class DiffCache:
+    """Diffs keyed by the content hashes of both sides; versions never change, so entries never go stale."""
+
+    def __init__(self, maxsize: int = DIFF_CACHE_SIZE):
+        self._diffs = LRUCache(maxsize=maxsize)
+
+    def get(self, from_hash: str, to_hash: str, granularity: str, context: int):
+        return self._diffs.get((from_hash, to_hash, granularity, context))
+
+    def set(self, from_hash: str, to_hash: str, granularity: str, context: int, diff: VersionDiff) -> None:
+        self._diffs.set((from_hash, to_hash, granularity, context), diff)
+
+    def stats(self) -> Dict[str, int]:
+        return self._diffs.stats()
+
+
+diff_cache = DiffCache()
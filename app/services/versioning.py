@@ -0,0 +1,47 @@
+import uuid
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Row, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.prompt import Prompt
+from app.models.tag import Tag
+from app.models.version import Version
+
+
+async def lock_prompt(db: AsyncSession, prompt_id: UUID) -> Optional[Row]:
+    """
+    Lock the prompt's row for the rest of the transaction and return its newest version's
+    (version_number, content_hash), or None if it has no versions.
+
+    Writers to one prompt take turns on this lock, so the version number they allocate and
+    the tags they move can't race. Writers to other prompts aren't blocked. The newest version
+    is read after the lock is granted: a statement that waited for a row lock still sees the
+    rest of the database as it was when the statement started.
+    """
+    await db.execute(select(Prompt.id).where(Prompt.id == prompt_id).with_for_update())
+    return (await db.execute(select(Version.version_number, Version.content_hash).where(
+        Version.prompt_id == prompt_id
+    ).order_by(Version.version_number.desc()).limit(1))).first()
+
+
+async def add_version(db: AsyncSession, prompt_id: UUID, version_number: int, digest: str) -> UUID:
+    version_id = uuid.uuid4()
+    await db.execute(insert(Version).values(
+        id=version_id, prompt_id=prompt_id, version_number=version_number, content_hash=digest
+    ))
+    return version_id
+
+
+async def move_tag(db: AsyncSession, prompt_id: UUID, name: str, version_id: UUID) -> UUID:
+    """Point the prompt's tag `name` at `version_id`, creating the tag if the prompt has none. Returns its id."""
+    tag_id = (await db.execute(
+        update(Tag).where(
+            Tag.name == name, Tag.version_id.in_(select(Version.id).where(Version.prompt_id == prompt_id))
+        ).values(version_id=version_id).returning(Tag.id)
+    )).scalars().first()
+    if tag_id is None:
+        tag_id = uuid.uuid4()
+        await db.execute(insert(Tag).values(id=tag_id, name=name, version_id=version_id))
+    return tag_id
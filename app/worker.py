@@ -0,0 +1,17 @@
+"""Gunicorn worker class: the app on uvicorn, with uvloop and httptools. See gunicorn.conf.py."""
+import warnings
+
+# uvicorn.workers is deprecated in favour of the separate uvicorn-worker package, which it matches
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Gunicorn kills a worker graceful_timeout seconds after asking it to stop. Uvicorn has to give
+        # up on open connections a little before that, so the lifespan shutdown still gets to run.
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - 2, 1)
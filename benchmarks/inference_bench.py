@@ -0,0 +1,147 @@
+"""
+Load test for /v1/inference/ against a running server.
+
+Meant to be pointed at a server started with the mock provider, so results reflect our own
+event loop, serialization and streaming overhead rather than a real provider:
+
+    MOCK_LLM_ENABLED=true uvicorn app.main:app --port 8000
+    python benchmarks/inference_bench.py --concurrency 64 --requests 2000 --stream
+
+Mock behaviour can be tuned per run through the model name,
+e.g. --model "mock?latency_ms=0&tps=1000&tokens=200".
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+# What /v1/inference/ returns, with a 200, when the provider call fails
+ERROR_OUTPUT = "An error occurred while generating the response."
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_one(client: httpx.AsyncClient, args, index: int) -> Dict:
+    body = {
+        "prompt_content": args.prompt,
+        "input": f"request {index}" if args.unique_inputs else "benchmark",
+        "model": args.model,
+        "provider": args.provider,
+        "stream": args.stream,
+    }
+    headers = {"X-Inference-Cache": "on" if args.cache else "off"}
+    started = time.perf_counter()
+    result = {"ok": False, "latency": None, "ttft": None, "events": 0, "bytes": 0}
+    try:
+        if not args.stream:
+            response = await client.post("/v1/inference/", json=body, headers=headers)
+            result["bytes"] = len(response.content)
+            result["ok"] = response.status_code == 200 and response.json().get("output") != ERROR_OUTPUT
+        else:
+            async with client.stream("POST", "/v1/inference/", json=body, headers=headers) as response:
+                event, failed = None, False
+                async for line in response.aiter_lines():
+                    result["bytes"] += len(line) + 1
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: ") and event == "message" and result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    elif line == "":
+                        if event == "message":
+                            result["events"] += 1
+                        elif event == "done":
+                            result["ok"] = True
+                        elif event == "error":
+                            failed = True
+                        event = None
+                # A stream counts as successful only if it reached its done event without an error
+                result["ok"] = result["ok"] and not failed and response.status_code == 200
+    except httpx.HTTPError:
+        result["ok"] = False
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+async def run(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        for i in range(args.warmup):
+            await run_one(client, args, -1 - i)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(i)
+        results: List[Dict] = []
+
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results.append(await run_one(client, args, index))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    latencies = [r["latency"] * 1000 for r in ok]
+    ttfts = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+    report = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 1) if elapsed else None,
+        "bytes_per_s": round(sum(r["bytes"] for r in results) / elapsed) if elapsed else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 1) if latencies else None,
+            **{f"p{p}": round(percentile(latencies, p), 1) if latencies else None for p in (50, 95, 99)},
+        },
+    }
+    if args.stream:
+        report["ttft_ms"] = {f"p{p}": round(percentile(ttfts, p), 1) if ttfts else None for p in (50, 95, 99)}
+        report["events_per_s"] = round(sum(r["events"] for r in ok) / elapsed, 1) if elapsed else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--stream", action="store_true", help="use SSE streaming")
+    parser.add_argument("--provider", default="mock")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--prompt", default="You are a benchmark.")
+    parser.add_argument("--unique-inputs", action="store_true", help="vary the input so responses can't be cached")
+    parser.add_argument("--cache", action="store_true", help="allow the inference cache")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report))
+        return
+    for key, value in report.items():
+        if isinstance(value, dict):
+            value = "  ".join(f"{k}={v}" for k, v in value.items())
+        print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
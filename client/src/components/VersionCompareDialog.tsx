@@ -1,4 +1,4 @@
-import { Button, Dialog, Flex, Select } from "@radix-ui/themes";
+import { Button, Dialog, Flex, Select, Text } from "@radix-ui/themes";
 import { useState, createContext, useContext } from "react";
 import CodeMirror from "@uiw/react-codemirror";
 import { promptsAPI } from "../store/api/prompts";
@@ -69,13 +69,14 @@ const Content: React.FC = () => {
     (state) => state.project.currentProjectId,
   );
 
-  const { data: leftPromptVersion } = promptsAPI.useGetPromptVersionQuery(
-    { promptId, version: leftVersion, projectId: currentProjectId! },
-    { skip: !currentProjectId },
-  );
-
-  const { data: rightPromptVersion } = promptsAPI.useGetPromptVersionQuery(
-    { promptId, version: rightVersion, projectId: currentProjectId! },
+  // The server diffs the two versions, so neither has to be downloaded in full
+  const { data: diff } = promptsAPI.useGetPromptDiffQuery(
+    {
+      promptId,
+      from: leftVersion,
+      to: rightVersion,
+      projectId: currentProjectId!,
+    },
     { skip: !currentProjectId },
   );
 
@@ -114,18 +115,15 @@ const Content: React.FC = () => {
           </Select.Root>
         </Flex>
 
-        <Flex gap="4">
-          <CodeMirror
-            value={leftPromptVersion?.content || ""}
-            readOnly
-            style={{ flex: 1 }}
-          />
-          <CodeMirror
-            value={rightPromptVersion?.content || ""}
-            readOnly
-            style={{ flex: 1 }}
-          />
-        </Flex>
+        {diff && (
+          <Text size="2" color="gray">
+            {diff.identical
+              ? "No changes"
+              : `${diff.additions} added, ${diff.deletions} removed`}
+          </Text>
+        )}
+
+        <CodeMirror value={diff?.unified || ""} readOnly />
       </Flex>
 
       <Flex gap="3" mt="4" justify="end">
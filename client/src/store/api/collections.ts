@@ -1,4 +1,5 @@
 import { createApi, fetchBaseQuery } from "@reduxjs/toolkit/query/react";
+import { fetchAllPages } from "./pagination";
 
 interface Collection {
   id: string;
@@ -48,7 +49,8 @@ export const collectionsApi = createApi({
   tagTypes: ["Collections"],
   endpoints: (builder) => ({
     getCollections: builder.query<CollectionList[], { projectId: string }>({
-      query: ({ projectId }) => `/?project_id=${projectId}`,
+      queryFn: ({ projectId }, _api, _extraOptions, baseQuery) =>
+        fetchAllPages<CollectionList>(`/?project_id=${projectId}`, baseQuery),
       providesTags: ["Collections"],
     }),
 
@@ -0,0 +1,36 @@
+import type {
+  FetchBaseQueryError,
+  FetchBaseQueryMeta,
+} from "@reduxjs/toolkit/query";
+
+// List endpoints return a page at a time; this header carries the next page's cursor
+const NEXT_CURSOR_HEADER = "X-Next-Cursor";
+// The server's maximum, so most lists arrive in a single request
+const PAGE_SIZE = 1000;
+
+type PageResult = {
+  data?: unknown;
+  error?: FetchBaseQueryError;
+  meta?: FetchBaseQueryMeta;
+};
+
+type BaseQuery = (url: string) => PageResult | PromiseLike<PageResult>;
+
+export async function fetchAllPages<T = any>(
+  url: string,
+  baseQuery: BaseQuery
+): Promise<{ data: T[] } | { error: FetchBaseQueryError }> {
+  const items: T[] = [];
+  const separator = url.includes("?") ? "&" : "?";
+  let after: string | null = null;
+  do {
+    const cursor: string = after ? `&after=${encodeURIComponent(after)}` : "";
+    const page = await baseQuery(`${url}${separator}limit=${PAGE_SIZE}${cursor}`);
+    if (page.error) {
+      return { error: page.error };
+    }
+    items.push(...(page.data as T[]));
+    after = page.meta?.response?.headers.get(NEXT_CURSOR_HEADER) ?? null;
+  } while (after);
+  return { data: items };
+}
@@ -1,4 +1,5 @@
 import { createApi, fetchBaseQuery } from "@reduxjs/toolkit/query/react";
+import { fetchAllPages } from "./pagination";
 
 export const projectsApi = createApi({
   reducerPath: "projectsApi",
@@ -15,7 +16,8 @@ export const projectsApi = createApi({
     }),
 
     listProjects: builder.query({
-      query: () => `/`,
+      queryFn: (_arg, _api, _extraOptions, baseQuery) =>
+        fetchAllPages("/", baseQuery),
       providesTags: ["Project"],
     }),
 
@@ -1,13 +1,13 @@
 import { createApi, fetchBaseQuery } from "@reduxjs/toolkit/query/react";
+import { fetchAllPages } from "./pagination";
 
 export const promptsAPI = createApi({
   baseQuery: fetchBaseQuery({ baseUrl: "http://localhost:8000/v1/prompts" }),
   tagTypes: ["Prompts"],
   endpoints: (builder) => ({
     getPrompts: builder.query({
-      query: ({ project_id }) => ({
-        url: `/?project_id=${project_id}`,
-      }),
+      queryFn: ({ project_id }, _api, _extraOptions, baseQuery) =>
+        fetchAllPages(`/?project_id=${project_id}`, baseQuery),
       providesTags: ["Prompts"],
     }),
     createPrompt: builder.mutation({
@@ -28,6 +28,11 @@ export const promptsAPI = createApi({
         `/${promptId}/versions/${version}?project_id=${projectId}`,
       providesTags: ["Prompts"],
     }),
+    getPromptDiff: builder.query({
+      query: ({ promptId, from, to, projectId }) =>
+        `/${promptId}/diff?from=${from}&to=${to}&project_id=${projectId}`,
+      providesTags: ["Prompts"],
+    }),
     updatePrompt: builder.mutation<
       {},
       { promptId: string; projectId: string; body: any }
@@ -0,0 +1,52 @@
+"""
+Production server settings:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Each worker is a uvicorn event loop (see app/worker.py). On SIGTERM or SIGHUP a worker stops
+accepting connections, closes change feeds and gives in-flight inference streams up to
+STREAM_DRAIN_TIMEOUT seconds to finish before it exits.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "app.worker.UvicornWorker"
+
+# Seconds an idle keep-alive connection is held open. Keep it above the idle timeout of any load
+# balancer in front, so the balancer closes connections first and never reuses a closed one.
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+# Connections the kernel queues per listening socket while every worker is busy
+backlog = int(os.getenv("BACKLOG", "2048"))
+
+# Seconds a stopping worker has before it is killed: the stream drain plus time to flush the final
+# events and run the lifespan shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", str(int(float(os.getenv("STREAM_DRAIN_TIMEOUT", "25"))) + 5)))
+# Workers that stop heartbeating for this long are restarted; uvicorn heartbeats from the event loop,
+# so this bounds a blocked loop, not a long request
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+# Restart each worker after this many requests (0 never does); the jitter keeps them from restarting together
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+
+# Metrics from every worker are merged through files in this directory (see app/metrics.py). It
+# must be set before the app is imported, and emptied of a previous run's files.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+
+def on_starting(server):
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drops the exited worker's live gauges, such as requests and subscribers in progress
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
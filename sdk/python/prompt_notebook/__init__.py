@@ -0,0 +1,6 @@
+"""Python client for Prompt Notebook with a local cache of resolved prompts."""
+from prompt_notebook.cache import Prompt
+from prompt_notebook.client import AsyncPromptNotebook, PromptNotebook
+from prompt_notebook.exceptions import PromptNotebookError, PromptNotFound
+
+__all__ = ["AsyncPromptNotebook", "Prompt", "PromptNotebook", "PromptNotebookError", "PromptNotFound"]
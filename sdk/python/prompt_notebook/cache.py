@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+# (project, prompt, kind, selector), e.g. ("default-project", "greeting", "tag", "production")
+CacheKey = Tuple[str, str, str, str]
+
+
+class Prompt(NamedTuple):
+    """A resolved prompt version, as returned by the tag and version lookup endpoints."""
+    id: str
+    version: int
+    content: str
+    created_at: str
+
+
+class Entry(NamedTuple):
+    prompt: Prompt
+    etag: Optional[str]
+    # Wall-clock times, so entries loaded from disk or a snapshot age correctly:
+    # the last time the server confirmed the entry, and the last time it was asked to
+    validated_at: float
+    checked_at: float
+
+    def to_dict(self, key: CacheKey) -> Dict:
+        return {
+            "key": list(key), "prompt": self.prompt._asdict(), "etag": self.etag,
+            "validated_at": self.validated_at, "checked_at": self.checked_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> Tuple[CacheKey, "Entry"]:
+        key = tuple(data["key"])
+        if len(key) != 4:
+            raise ValueError(f"Malformed cache key {data['key']!r}")
+        return key, cls(
+            prompt=Prompt(**data["prompt"]), etag=data.get("etag"),
+            validated_at=float(data["validated_at"]), checked_at=float(data.get("checked_at", data["validated_at"])),
+        )
+
+
+class DiskCache:
+    """
+    One JSON file per entry under `directory`, shared by every process that points at it.
+
+    Files are replaced atomically, so readers never see a partial entry. The disk is a
+    second tier: failures to read or write it are logged and otherwise ignored.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: CacheKey) -> Path:
+        name = hashlib.sha256(json.dumps(key).encode()).hexdigest()[:32]
+        return self.directory / f"{name}.json"
+
+    def get(self, key: CacheKey) -> Optional[Entry]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                stored_key, entry = Entry.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable cache entry for {key}: {e}")
+            return None
+        # Guards against the (vanishingly unlikely) hash collision
+        return entry if stored_key == key else None
+
+    def set(self, key: CacheKey, entry: Entry) -> None:
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry.to_dict(key), f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {key}: {e}")
+
+    def delete(self, key: CacheKey) -> None:
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete cache entry for {key}: {e}")
+
+
+class PromptCache:
+    """
+    Thread-safe in-memory LRU of resolved prompts, backed by an optional DiskCache.
+
+    A memory miss falls through to the disk and promotes what it finds, so only the
+    first lookup of a key in a process pays for a file read.
+    """
+
+    def __init__(self, maxsize: int = 10000, directory: Optional[Union[str, Path]] = None):
+        self.maxsize = maxsize
+        self.disk = DiskCache(directory) if directory is not None else None
+        self._data: "OrderedDict[CacheKey, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                return entry
+        if self.disk is None:
+            return None
+        entry = self.disk.get(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def set(self, key: CacheKey, entry: Entry, persist: bool = True) -> None:
+        self._remember(key, entry)
+        if persist and self.disk is not None:
+            self.disk.set(key, entry)
+
+    def delete(self, key: CacheKey) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def _remember(self, key: CacheKey, entry: Entry) -> None:
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[CacheKey, Entry]]:
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def save_snapshot(path: Union[str, Path], items: List[Tuple[CacheKey, Entry]]) -> None:
+    """Write entries to `path` atomically, for later use with `load_snapshot`."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({
+            "format": SNAPSHOT_FORMAT, "saved_at": time.time(),
+            "entries": [entry.to_dict(key) for key, entry in items],
+        }, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: Union[str, Path]) -> Iterator[Tuple[CacheKey, Entry]]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {data.get('format')!r} in {path}")
+    for item in data["entries"]:
+        yield Entry.from_dict(item)
@@ -0,0 +1,362 @@
+"""
+Clients for resolving prompts by tag or version.
+
+Lookups are answered from a local cache whenever possible:
+
+- An entry is fresh for `ttl` seconds after the server last confirmed it.
+- For `max_stale` seconds after that it is still returned immediately, while one background
+  request revalidates it with If-None-Match. An unchanged prompt costs the server a 304.
+- Past that window the lookup waits for the server.
+- Concurrent lookups of a key share one request.
+- When the server can't be reached or fails, the cached entry is returned, however old it is.
+- Versions never change, so a lookup by version number is fetched at most once.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+from uuid import UUID
+
+import httpx
+
+from prompt_notebook.cache import CacheKey, Entry, Prompt, PromptCache, load_snapshot, save_snapshot
+from prompt_notebook.exceptions import PromptNotebookError, PromptNotFound
+
+logger = logging.getLogger(__name__)
+
+# What a cache lookup leaves to do
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+# Items per :resolve request, the server's limit
+RESOLVE_BATCH_SIZE = 1000
+
+
+class _ClientBase:
+    def __init__(
+        self,
+        project: str,
+        base_url: str = "http://localhost:8000",
+        *,
+        ttl: float = 60.0,
+        max_stale: float = 3600.0,
+        cache_size: int = 10000,
+        cache_dir: Optional[Union[str, Path]] = None,
+        snapshot: Optional[Union[str, Path]] = None,
+        offline: bool = False,
+        timeout: float = 5.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        if offline and snapshot is None and cache_dir is None:
+            raise ValueError("Offline mode needs a snapshot or a cache_dir to read prompts from")
+        self.project = project
+        self.base_url = base_url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.offline = offline
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._cache = PromptCache(maxsize=cache_size, directory=cache_dir)
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "requests": 0, "not_modified": 0, "errors": 0}
+        if snapshot is not None:
+            self._seed(snapshot)
+
+    def _seed(self, snapshot: Union[str, Path]) -> None:
+        # Entries the disk cache already has in a newer state are kept
+        for key, entry in load_snapshot(snapshot):
+            current = self._cache.get(key)
+            if current is None or current.validated_at < entry.validated_at:
+                self._cache.set(key, entry, persist=False)
+
+    def _key(self, prompt: str, tag: Optional[str], version: Optional[int], project: Optional[str]) -> CacheKey:
+        if tag is not None and version is not None:
+            raise ValueError("Specify either tag or version, not both")
+        project = project or self.project
+        if version is not None:
+            return (project, prompt, "version", str(int(version)))
+        return (project, prompt, "tag", tag or "latest")
+
+    def _plan(self, key: CacheKey) -> Tuple[Optional[Entry], str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            if self.offline:
+                raise PromptNotFound(f"{key[1]} ({key[2]} {key[3]}) is not in the offline cache")
+            self.stats["misses"] += 1
+            return None, MISS
+        if self.offline or key[2] == "version":
+            self.stats["hits"] += 1
+            return entry, FRESH
+        now = time.time()
+        if now - entry.checked_at < self.ttl:
+            self.stats["hits"] += 1
+            return entry, FRESH
+        if now - entry.validated_at < self.ttl + self.max_stale:
+            self.stats["stale_hits"] += 1
+            return entry, STALE
+        self.stats["misses"] += 1
+        return entry, MISS
+
+    def _is_fresh(self, key: CacheKey) -> bool:
+        entry = self._cache.get(key)
+        return entry is not None and time.time() - entry.checked_at < self.ttl
+
+    @staticmethod
+    def _project_params(project: str) -> Dict[str, str]:
+        try:
+            return {"project_id": str(UUID(project))}
+        except ValueError:
+            return {"project_slug": project}
+
+    def _request(self, key: CacheKey, entry: Optional[Entry]) -> Tuple[str, Dict[str, str], Dict[str, str]]:
+        project, prompt, kind, selector = key
+        collection = "tags" if kind == "tag" else "versions"
+        path = f"/v1/prompts/{quote(prompt, safe='')}/{collection}/{quote(selector, safe='')}"
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+        return path, self._project_params(project), headers
+
+    def _result(self, key: CacheKey, entry: Optional[Entry], response: httpx.Response) -> Entry:
+        now = time.time()
+        if response.status_code == 304 and entry is not None:
+            self.stats["not_modified"] += 1
+            entry = entry._replace(validated_at=now, checked_at=now)
+        elif response.status_code == 200:
+            entry = Entry(_prompt(response.json()), response.headers.get("etag"), now, now)
+        elif response.status_code == 404:
+            self._cache.delete(key)
+            raise PromptNotFound(_detail(response))
+        else:
+            raise PromptNotebookError(_detail(response), status_code=response.status_code)
+        self._cache.set(key, entry)
+        return entry
+
+    def _failed(self, key: CacheKey, entry: Optional[Entry], error: Exception) -> Entry:
+        """Fall back to the cached entry, if there is one, and hold off asking again for `ttl`."""
+        self.stats["errors"] += 1
+        if entry is None or isinstance(error, PromptNotebookError) and not error.retryable:
+            if isinstance(error, PromptNotebookError):
+                raise error
+            raise PromptNotebookError(f"Could not reach the server: {error!r}") from error
+        logger.warning(f"Serving cached {key[1]} ({key[2]} {key[3]}): {error}")
+        entry = entry._replace(checked_at=time.time())
+        self._cache.set(key, entry, persist=False)
+        return entry
+
+    def _resolved(self, project: str, tag: str, resolutions: List[Dict]) -> Dict[str, Prompt]:
+        now = time.time()
+        prompts = {}
+        for resolution in resolutions:
+            if resolution.get("result") is None:
+                logger.warning(f"Could not prefetch {resolution['prompt']}: {resolution.get('error')}")
+                continue
+            prompt = _prompt(resolution["result"])
+            self._cache.set((project, resolution["prompt"], "tag", tag), Entry(prompt, None, now, now))
+            prompts[resolution["prompt"]] = prompt
+        return prompts
+
+    def save_snapshot(self, path: Union[str, Path]) -> None:
+        """Write every prompt cached in memory to `path`, for use as `snapshot=` (e.g. with `offline=True`)."""
+        save_snapshot(path, self._cache.items())
+
+
+def _prompt(data: Dict) -> Prompt:
+    return Prompt(id=data["id"], version=data["version"], content=data["content"], created_at=data["created_at"])
+
+
+def _detail(response: httpx.Response) -> str:
+    try:
+        return str(response.json().get("detail", response.text))
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+
+def _batches(prompts: Iterable[str]) -> Iterable[List[str]]:
+    batch: List[str] = []
+    for prompt in prompts:
+        batch.append(prompt)
+        if len(batch) == RESOLVE_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PromptNotebook(_ClientBase):
+    """
+    Blocking client. Safe to share between threads; background revalidation runs on a small thread pool.
+
+        notebook = PromptNotebook("my-project", "http://prompt-notebook:8000", cache_dir="/var/cache/prompts")
+        system_prompt = notebook.get("support-agent", tag="production").content
+    """
+
+    def __init__(self, project: str, base_url: str = "http://localhost:8000", *, revalidation_workers: int = 4,
+                 **options):
+        super().__init__(project, base_url, **options)
+        self._http = httpx.Client(base_url=base_url, timeout=self.timeout, headers=self.headers)
+        self._executor = ThreadPoolExecutor(max_workers=revalidation_workers, thread_name_prefix="prompt-notebook")
+        self._inflight: Dict[CacheKey, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def get(self, prompt: str, tag: Optional[str] = None, version: Optional[int] = None,
+            project: Optional[str] = None) -> Prompt:
+        """Resolve a prompt by tag ('latest' when neither tag nor version is given) or version number."""
+        key = self._key(prompt, tag, version, project)
+        entry, action = self._plan(key)
+        if action == FRESH:
+            return entry.prompt
+        if action == STALE:
+            self._revalidate(key)
+            return entry.prompt
+        return self._fetch(key).prompt
+
+    def prefetch(self, prompts: Iterable[str], tag: str = "latest", project: Optional[str] = None) -> Dict[str, Prompt]:
+        """Warm the cache with many prompts' `tag` in one request per thousand prompts."""
+        project = project or self.project
+        resolved = {}
+        for batch in _batches(prompts):
+            response = self._http.post("/v1/prompts:resolve", params=self._project_params(project),
+                                       json={"items": [{"prompt": prompt, "tag": tag} for prompt in batch]})
+            if response.status_code != 200:
+                raise PromptNotebookError(_detail(response), status_code=response.status_code)
+            resolved.update(self._resolved(project, tag, response.json()))
+        return resolved
+
+    def _fetch(self, key: CacheKey) -> Entry:
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            entry = self._load(key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _load(self, key: CacheKey) -> Entry:
+        entry = self._cache.get(key)
+        path, params, headers = self._request(key, entry)
+        self.stats["requests"] += 1
+        try:
+            return self._result(key, entry, self._http.get(path, params=params, headers=headers))
+        except (httpx.HTTPError, PromptNotebookError) as e:
+            return self._failed(key, entry, e)
+
+    def _revalidate(self, key: CacheKey) -> None:
+        with self._inflight_lock:
+            if key in self._inflight:
+                return
+        self._executor.submit(self._background_fetch, key)
+
+    def _background_fetch(self, key: CacheKey) -> None:
+        # Several lookups may have queued this key before the first request went out
+        if self._is_fresh(key):
+            return
+        try:
+            self._fetch(key)
+        except PromptNotebookError as e:
+            logger.warning(f"Could not revalidate {key[1]} ({key[2]} {key[3]}): {e}")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._http.close()
+
+    def __enter__(self) -> "PromptNotebook":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncPromptNotebook(_ClientBase):
+    """
+    asyncio client. Background revalidation runs as tasks on the event loop that made the lookup.
+
+        notebook = AsyncPromptNotebook("my-project", "http://prompt-notebook:8000")
+        system_prompt = (await notebook.get("support-agent", tag="production")).content
+    """
+
+    def __init__(self, project: str, base_url: str = "http://localhost:8000", **options):
+        super().__init__(project, base_url, **options)
+        self._http = httpx.AsyncClient(base_url=base_url, timeout=self.timeout, headers=self.headers)
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+
+    async def get(self, prompt: str, tag: Optional[str] = None, version: Optional[int] = None,
+                  project: Optional[str] = None) -> Prompt:
+        """Resolve a prompt by tag ('latest' when neither tag nor version is given) or version number."""
+        key = self._key(prompt, tag, version, project)
+        entry, action = self._plan(key)
+        if action == FRESH:
+            return entry.prompt
+        if action == STALE:
+            self._revalidate(key)
+            return entry.prompt
+        # Shielded so a cancelled caller doesn't cancel the request others are waiting on
+        return (await asyncio.shield(self._fetch(key))).prompt
+
+    async def prefetch(self, prompts: Iterable[str], tag: str = "latest",
+                       project: Optional[str] = None) -> Dict[str, Prompt]:
+        """Warm the cache with many prompts' `tag` in one request per thousand prompts."""
+        project = project or self.project
+        resolved = {}
+        for batch in _batches(prompts):
+            response = await self._http.post("/v1/prompts:resolve", params=self._project_params(project),
+                                             json={"items": [{"prompt": prompt, "tag": tag} for prompt in batch]})
+            if response.status_code != 200:
+                raise PromptNotebookError(_detail(response), status_code=response.status_code)
+            resolved.update(self._resolved(project, tag, response.json()))
+        return resolved
+
+    def _fetch(self, key: CacheKey) -> "asyncio.Task[Entry]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def _finished(self, key: CacheKey, task: "asyncio.Task[Entry]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marks the error as retrieved: a background revalidation may have nobody awaiting it
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, key: CacheKey) -> Entry:
+        entry = self._cache.get(key)
+        path, params, headers = self._request(key, entry)
+        self.stats["requests"] += 1
+        try:
+            return self._result(key, entry, await self._http.get(path, params=params, headers=headers))
+        except (httpx.HTTPError, PromptNotebookError) as e:
+            return self._failed(key, entry, e)
+
+    def _revalidate(self, key: CacheKey) -> None:
+        if key not in self._inflight:
+            self._fetch(key).add_done_callback(lambda done: _log_revalidation(key, done))
+
+    async def aclose(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await self._http.aclose()
+
+    async def __aenter__(self) -> "AsyncPromptNotebook":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+def _log_revalidation(key: CacheKey, task: "asyncio.Task[Entry]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Could not revalidate {key[1]} ({key[2]} {key[3]}): {task.exception()}")
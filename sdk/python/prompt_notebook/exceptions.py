@@ -0,0 +1,17 @@
+from typing import Optional
+
+
+class PromptNotebookError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        """Whether a cached entry may stand in: the server was unreachable or failed, rather than refused."""
+        return self.status_code is None or self.status_code >= 500
+
+
+class PromptNotFound(PromptNotebookError):
+    def __init__(self, message: str):
+        super().__init__(message, status_code=404)